@@ -3,12 +3,46 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from inference_backends import resolve_weights
+
+
+# Мапинг классов
+CLASS_TO_ERROR = {
+    0: {'type': 'missing_stamp', 'severity': 'critical',
+        'description': 'Отсутствует основная надпись'},
+    1: {'type': 'wrong_document_code', 'severity': 'high',
+        'description': 'Неправильный код документа'},
+    2: {'type': 'code_name_mismatch', 'severity': 'high',
+        'description': 'Несоответствие кода и наименования'},
+    3: {'type': 'wrong_tt_position', 'severity': 'medium',
+        'description': 'ТТ не над основной надписью'},
+    4: {'type': 'missing_letter_designation', 'severity': 'medium',
+        'description': 'Отсутствует буквенное обозначение'},
+    5: {'type': 'missing_asterisks', 'severity': 'low',
+        'description': 'Отсутствуют * на чертеже'},
+    6: {'type': 'dimension_30deg_violation', 'severity': 'medium',
+        'description': 'Размер в зоне 30° без полки'},
+    7: {'type': 'missing_tolerance_arrow', 'severity': 'high',
+        'description': 'Отсутствует стрелка в допуске'},
+    8: {'type': 'missing_general_roughness', 'severity': 'medium',
+        'description': 'Отсутствует √ в углу чертежа'}
+}
 
 
 class GOSTErrorDetector:
-    def __init__(self, model_path='models/best.pt'):
+    def __init__(self, model_path='models/best.pt', backend=None):
         """
         Инициализация детектора с обученной моделью
+
+        Args:
+            model_path: путь к весам .pt
+            backend: бэкенд инференса из inference_backends.BACKENDS
+                     (по умолчанию config.INFERENCE_BACKEND)
         """
         if not os.path.exists(model_path):
             raise FileNotFoundError(
@@ -16,30 +50,40 @@ class GOSTErrorDetector:
                 f"💡 Обучите модель командой: python train_yolo.py"
             )
 
-        print(f"📥 Загрузка модели: {model_path}")
-        self.model = YOLO(model_path)
-
-        # Мапинг классов
-        self.class_to_error = {
-            0: {'type': 'missing_stamp', 'severity': 'critical',
-                'description': 'Отсутствует основная надпись'},
-            1: {'type': 'wrong_document_code', 'severity': 'high',
-                'description': 'Неправильный код документа'},
-            2: {'type': 'code_name_mismatch', 'severity': 'high',
-                'description': 'Несоответствие кода и наименования'},
-            3: {'type': 'wrong_tt_position', 'severity': 'medium',
-                'description': 'ТТ не над основной надписью'},
-            4: {'type': 'missing_letter_designation', 'severity': 'medium',
-                'description': 'Отсутствует буквенное обозначение'},
-            5: {'type': 'missing_asterisks', 'severity': 'low',
-                'description': 'Отсутствуют * на чертеже'},
-            6: {'type': 'dimension_30deg_violation', 'severity': 'medium',
-                'description': 'Размер в зоне 30° без полки'},
-            7: {'type': 'missing_tolerance_arrow', 'severity': 'high',
-                'description': 'Отсутствует стрелка в допуске'},
-            8: {'type': 'missing_general_roughness', 'severity': 'medium',
-                'description': 'Отсутствует √ в углу чертежа'}
-        }
+        self.backend = backend or config.INFERENCE_BACKEND
+        self.model_path = model_path
+        self.weights_path = resolve_weights(model_path, self.backend)
+
+        print(f"📥 Загрузка модели: {self.weights_path} ({self.backend})")
+        self.model = YOLO(self.weights_path, task='detect')
+
+        # Предиктор ultralytics не потокобезопасен: тайловые пачки из
+        # нескольких потоков идут через модель по очереди
+        self._predict_lock = threading.Lock()
+
+        self.class_to_error = CLASS_TO_ERROR
+
+        # Метаданные классов массивами: тип/важность берутся индексацией
+        # по всему столбцу классов, а не class_to_error.get на каждую рамку
+        self.class_table = ClassTable(self.class_to_error)
+
+    def warmup(self, imgsz=config.DETECTOR_IMGSZ):
+        """
+        Пробный прогон на пустом изображении: инициализирует предиктор
+        и выделяет буферы, чтобы первый реальный запрос не платил за это
+        """
+        dummy = np.full((imgsz, imgsz, 3), 255, dtype=np.uint8)
+        self.model(dummy, verbose=False)
+
+    def detect(self, image_path, conf_threshold=0.25):
+        """
+        Детекция с колоночным результатом (без построения словарей)
+
+        Returns:
+            Detections: массивы xyxy/conf/cls, .to_dicts() — формат detect_errors
+        """
+        results = self.model(image_path, conf=conf_threshold, verbose=False)[0]
+        return Detections.from_results(results, self.class_table)
 
     def detect_errors(self, image_path, conf_threshold=0.25):
         """
@@ -55,44 +99,437 @@ class GOSTErrorDetector:
         print(f"🔍 Анализ: {os.path.basename(image_path)}")
 
         # Запускаем inference
-        results = self.model(image_path, conf=conf_threshold, verbose=False)[0]
-
-        errors = []
-        for box in results.boxes:
-            class_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            bbox = box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-
-            error_info = self.class_to_error.get(class_id, {})
-
-            errors.append({
-                'type': error_info.get('type', 'unknown'),
-                'severity': error_info.get('severity', 'medium'),
-                'description': error_info.get('description', ''),
-                'confidence': round(confidence, 3),
-                'bbox': {
-                    'x': int(bbox[0]),
-                    'y': int(bbox[1]),
-                    'width': int(bbox[2] - bbox[0]),
-                    'height': int(bbox[3] - bbox[1])
-                },
-                'location': 'drawing'
-            })
+        errors = self.detect(image_path, conf_threshold).to_dicts()
 
         print(f"   Найдено ошибок: {len(errors)}")
         return errors
 
+    def detect_errors_batch(self, images, conf_threshold=0.25, batch_size=8):
+        """
+        Детекция ошибок сразу на нескольких чертежах
+
+        Изображения прогоняются через модель пачками по batch_size:
+        на CPU один батчевый проход заметно дешевле N одиночных.
+
+        Args:
+            images: список путей к изображениям (или numpy-массивов)
+            conf_threshold: порог уверенности (0.0-1.0)
+            batch_size: максимальный размер батча
+
+        Returns:
+            list: список ошибок для каждого изображения (в том же порядке)
+        """
+        images = list(images)
+        print(f"🔍 Пакетный анализ: {len(images)} изображений")
+
+        all_errors = []
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            results = self.model(chunk, conf=conf_threshold, verbose=False)
+            all_errors.extend(self._results_to_errors(r) for r in results)
+
+        print(f"   Найдено ошибок: {sum(len(e) for e in all_errors)}")
+        return all_errors
+
+    def detect_errors_tiled(self, image_path, conf_threshold=0.25, return_stats=False, **options):
+        """
+        Тайловая детекция на полноразмерном чертеже моделью этого процесса
+
+        См. detect_tiled; options — tile_size, overlap, batch_size, workers.
+        """
+        return detect_tiled(image_path, self.detect_tiles, conf_threshold,
+                            return_stats=return_stats, **options)
+
+    def detect_tiles(self, crops, conf_threshold=0.25, imgsz=None):
+        """
+        Один проход модели по пачке тайлов
+
+        Args:
+            imgsz: вход модели (сторона тайла) — иначе тайл сжимается
+                   до размера по умолчанию и теряет разрешение
+
+        Returns:
+            list: массивы рамок (N, 6) x1, y1, x2, y2, conf, cls по тайлам
+        """
+        with self._predict_lock:
+            results = self.model(crops, conf=conf_threshold, imgsz=imgsz or config.TILE_SIZE, verbose=False)
+        return [r.boxes.data.cpu().numpy() for r in results]
+
+    def _results_to_errors(self, results):
+        """Преобразует результат YOLO для одного изображения в список ошибок"""
+        return Detections.from_results(results, self.class_table).to_dicts()
+
+    def detect_and_render(self, image_path, conf_threshold=0.25):
+        """
+        Детекция с отложенной визуализацией из того же прохода модели
+
+        Returns:
+            DetectionResult: .errors — список ошибок, .annotated — размеченное
+            изображение (рисуется только при первом обращении)
+        """
+        print(f"🔍 Анализ: {os.path.basename(image_path)}")
+
+        results = self.model(image_path, conf=conf_threshold, verbose=False)[0]
+        errors = self._results_to_errors(results)
+
+        print(f"   Найдено ошибок: {len(errors)}")
+        return DetectionResult(errors, results)
+
     def visualize_errors(self, image_path, output_path='result.png', conf_threshold=0.25):
         """
         Визуализация найденных ошибок
         """
-        results = self.model(image_path, conf=conf_threshold)[0]
-        annotated = results.plot()  # Автоматическая аннотация
-        cv2.imwrite(output_path, annotated)
+        return self.detect_and_render(image_path, conf_threshold).save_annotated(output_path)
+
+
+class ClassTable:
+    """Метаданные классов в виде массивов, индексируемых номером класса"""
+
+    def __init__(self, class_to_error):
+        self.size = max(class_to_error) + 1 if class_to_error else 0
+
+        # Последний элемент — значения для неизвестного класса
+        self.types = np.full(self.size + 1, 'unknown', dtype=object)
+        self.severities = np.full(self.size + 1, 'medium', dtype=object)
+        self.descriptions = np.full(self.size + 1, '', dtype=object)
+
+        for class_id, info in class_to_error.items():
+            self.types[class_id] = info.get('type', 'unknown')
+            self.severities[class_id] = info.get('severity', 'medium')
+            self.descriptions[class_id] = info.get('description', '')
+
+    def index(self, cls):
+        """Номера классов → индексы в таблице (неизвестные → последний элемент)"""
+        return np.where((cls >= 0) & (cls < self.size), cls, self.size)
+
+
+class Detections:
+    """
+    Колоночный результат детекции
+
+    xyxy — float32 (N, 4), conf — float32 (N,), cls — int64 (N,).
+    Список словарей в формате detect_errors строится только в to_dicts().
+    """
+
+    def __init__(self, xyxy, conf, cls, class_table):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.class_table = class_table
+
+    @classmethod
+    def from_results(cls, results, class_table):
+        """Из результата YOLO одним переносом тензора boxes.data"""
+        return cls.from_array(results.boxes.data.cpu().numpy(), class_table)
+
+    @classmethod
+    def from_array(cls, data, class_table):
+        """Из массива (N, 6): x1, y1, x2, y2, conf, cls"""
+        return cls(
+            np.ascontiguousarray(data[:, :4], dtype=np.float32),
+            data[:, -2].astype(np.float32),
+            data[:, -1].astype(np.int64),
+            class_table
+        )
+
+    @classmethod
+    def concat(cls, items, class_table):
+        items = [d for d in items if len(d)]
+        if not items:
+            return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32),
+                       np.zeros(0, np.int64), class_table)
+        return cls(
+            np.concatenate([d.xyxy for d in items]),
+            np.concatenate([d.conf for d in items]),
+            np.concatenate([d.cls for d in items]),
+            class_table
+        )
+
+    def __len__(self):
+        return len(self.conf)
+
+    def shifted(self, dx, dy):
+        """Сдвиг рамок (координаты тайла → координаты страницы)"""
+        return Detections(self.xyxy + np.array([dx, dy, dx, dy], np.float32),
+                          self.conf, self.cls, self.class_table)
+
+    def select(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        return Detections(self.xyxy[indices], self.conf[indices], self.cls[indices], self.class_table)
+
+    def filter(self, min_conf):
+        return self.select(np.flatnonzero(self.conf >= min_conf))
+
+    @property
+    def types(self):
+        return self.class_table.types[self.class_table.index(self.cls)]
+
+    @property
+    def severities(self):
+        return self.class_table.severities[self.class_table.index(self.cls)]
+
+    def to_dicts(self):
+        """Список ошибок в формате detect_errors"""
+        index = self.class_table.index(self.cls)
+        types = self.class_table.types[index].tolist()
+        severities = self.class_table.severities[index].tolist()
+        descriptions = self.class_table.descriptions[index].tolist()
+
+        confidences = np.round(self.conf.astype(np.float64), 3).tolist()
+        x = self.xyxy[:, 0].astype(np.int64).tolist()
+        y = self.xyxy[:, 1].astype(np.int64).tolist()
+        widths = (self.xyxy[:, 2] - self.xyxy[:, 0]).astype(np.int64).tolist()
+        heights = (self.xyxy[:, 3] - self.xyxy[:, 1]).astype(np.int64).tolist()
+
+        return [
+            {
+                'type': t,
+                'severity': sev,
+                'description': desc,
+                'confidence': c,
+                'bbox': {'x': bx, 'y': by, 'width': bw, 'height': bh},
+                'location': 'drawing'
+            }
+            for t, sev, desc, c, bx, by, bw, bh
+            in zip(types, severities, descriptions, confidences, x, y, widths, heights)
+        ]
+
+
+class DetectionResult:
+    """Результат одного прохода модели: ошибки + ленивая визуализация"""
+
+    def __init__(self, errors, results):
+        self.errors = errors
+        self._results = results
+        self._annotated = None
+
+    @property
+    def annotated(self):
+        """Размеченное изображение (BGR), рисуется один раз по требованию"""
+        if self._annotated is None:
+            self._annotated = self._results.plot()
+        return self._annotated
+
+    def save_annotated(self, output_path):
+        cv2.imwrite(output_path, self.annotated)
         print(f"✅ Визуализация сохранена: {output_path}")
         return output_path
 
 
+# Цвета рамок по важности (BGR), как на странице результатов
+SEVERITY_COLORS = {
+    'critical': (69, 53, 220),
+    'high': (7, 193, 255),
+    'medium': (184, 162, 23),
+    'low': (69, 167, 40)
+}
+
+
+def render_errors(image, errors, output_path=None):
+    """
+    Рисует рамки ошибок на изображении без запуска модели
+
+    Подходит и для результатов detect_errors, и для сохранённых
+    записей DetectedError.to_dict() — у них одинаковые ключи
+    'type', 'severity' и 'bbox'.
+
+    Args:
+        image: путь к изображению или numpy-массив BGR
+        errors: список ошибок
+        output_path: куда сохранить (если None — только вернуть массив)
+
+    Returns:
+        numpy.ndarray: размеченное изображение
+    """
+    if isinstance(image, str):
+        path = image
+        image = cv2.imread(path)
+        if image is None:
+            raise FileNotFoundError(f"❌ Не удалось прочитать изображение: {path}")
+    else:
+        image = image.copy()
+
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    thickness = max(2, int(round(max(image.shape[:2]) / 800)))
+    font_scale = thickness / 3
+
+    for err in errors:
+        bbox = err.get('bbox')
+        if not bbox:
+            continue
+
+        color = SEVERITY_COLORS.get(err.get('severity'), (128, 128, 128))
+        x, y = bbox['x'], bbox['y']
+        cv2.rectangle(image, (x, y), (x + bbox['width'], y + bbox['height']), color, thickness)
+
+        label = err.get('type', '')
+        if err.get('confidence') is not None:
+            label = f"{label} {err['confidence']:.2f}"
+        cv2.putText(image, label, (x, max(y - 2 * thickness, 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, max(1, thickness // 2))
+
+    if output_path:
+        cv2.imwrite(output_path, image)
+        print(f"✅ Визуализация сохранена: {output_path}")
+    return image
+
+def detect_tiled(image_path, run_tiles, conf_threshold=0.25, tile_size=None, overlap=None,
+                 batch_size=None, workers=None, return_stats=False):
+    """
+    Тайловая детекция на полноразмерном чертеже
+
+    Страница режется на перекрывающиеся тайлы, тайлы пачками по batch_size
+    отдаются run_tiles — до workers пачек одновременно, рамки переводятся
+    в координаты страницы, а дубликаты на стыках тайлов сливаются через NMS.
+    Модель здесь не нужна: run_tiles может быть и моделью процесса
+    (GOSTErrorDetector.detect_tiles), и репликами пула инференса.
+
+    Args:
+        image_path: путь к изображению (или numpy-массив BGR)
+        run_tiles: функция (crops, conf_threshold, imgsz) -> массивы рамок (N, 6) по тайлам
+        conf_threshold: порог уверенности (0.0-1.0)
+        tile_size: сторона тайла в пикселях, она же вход модели (config.TILE_SIZE)
+        overlap: доля перекрытия соседних тайлов (config.TILE_OVERLAP)
+        batch_size: тайлов в одном проходе модели (config.TILE_BATCH_SIZE)
+        workers: пачек в работе одновременно (config.TILE_WORKERS)
+        return_stats: вернуть также статистику затрат на страницу
+
+    Returns:
+        list: список найденных ошибок (или (errors, stats) при return_stats)
+    """
+    tile_size = tile_size or config.TILE_SIZE
+    overlap = config.TILE_OVERLAP if overlap is None else overlap
+    batch_size = batch_size or config.TILE_BATCH_SIZE
+    workers = workers or config.TILE_WORKERS
+    class_table = ClassTable(CLASS_TO_ERROR)
+
+    start = time.time()
+    if isinstance(image_path, str):
+        print(f"🔍 Тайловый анализ: {os.path.basename(image_path)}")
+        image = cv2.imread(image_path)
+        if image is None:
+            raise FileNotFoundError(f"❌ Не удалось прочитать изображение: {image_path}")
+    else:
+        image = image_path
+
+    h, w = image.shape[:2]
+    windows = tile_windows(w, h, tile_size, overlap)
+    if config.TILE_FULL_PASS and len(windows) > 1:
+        # Уменьшенная целая страница ловит крупные объекты (штамп),
+        # которые разрезаются тайлами
+        windows.append((0, 0, w, h))
+
+    def run_chunk(chunk):
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in chunk]
+        boxes = run_tiles(crops, conf_threshold, tile_size)
+        return Detections.concat([
+            Detections.from_array(data, class_table).shifted(x0, y0)
+            for (x0, y0, _, _), data in zip(chunk, boxes)
+        ], class_table)
+
+    chunks = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix='tiles') as executor:
+            parts = list(executor.map(run_chunk, chunks))
+    else:
+        parts = [run_chunk(chunk) for chunk in chunks]
+
+    detections = Detections.concat(parts, class_table)
+    raw_boxes = len(detections)
+
+    keep = nms(detections.xyxy, detections.conf, detections.cls,
+               config.TILE_MERGE_THRESHOLD, metric='ios')
+    errors = detections.select(keep).to_dicts()
+
+    elapsed = time.time() - start
+    stats = {
+        'image_size': [w, h],
+        'tiles': len(windows),
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'batch_size': batch_size,
+        'workers': workers,
+        'raw_boxes': raw_boxes,
+        'merged_boxes': len(errors),
+        'time': round(elapsed, 3),
+        'time_per_tile': round(elapsed / len(windows), 4) if windows else 0
+    }
+    print(f"   Тайлов: {len(windows)}, найдено ошибок: {len(errors)} "
+          f"({raw_boxes} до слияния), {elapsed:.2f} с")
+
+    if return_stats:
+        return errors, stats
+    return errors
+
+
+def tile_windows(width, height, tile_size, overlap):
+    """
+    Сетка перекрывающихся тайлов [(x0, y0, x1, y1), ...] для страницы
+
+    Крайние тайлы сдвигаются внутрь страницы, чтобы все тайлы
+    были одного размера (кроме страниц меньше тайла).
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in starts(height)
+        for x0 in starts(width)
+    ]
+
+
+def nms(xyxy, scores, classes, threshold, metric='iou'):
+    """
+    Non-maximum suppression по классам
+
+    metric='iou' — классическое пересечение над объединением,
+    metric='ios' — пересечение над меньшей рамкой: сливает обрезанную
+    на стыке тайлов часть объекта с его полной рамкой из соседнего тайла.
+
+    Returns:
+        list: индексы оставленных рамок (по убыванию уверенности)
+    """
+    if len(scores) == 0:
+        return []
+
+    # Сдвигаем классы в непересекающиеся области, чтобы NMS шёл по классам
+    offset = classes.astype(np.float32)[:, None] * (xyxy.max() + 1)
+    boxes = xyxy + offset
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+
+        if metric == 'ios':
+            denom = np.minimum(areas[i], areas[rest])
+        else:
+            denom = areas[i] + areas[rest] - inter
+        overlap = inter / np.maximum(denom, 1e-6)
+
+        order = rest[overlap <= threshold]
+
+    return keep
+
+
 # Тестирование
 if __name__ == '__main__':
     import sys
@@ -121,7 +558,8 @@ if __name__ == '__main__':
 
     if test_img:
         print(f"\n🧪 Тест на изображении: {test_img}\n")
-        errors = detector.detect_errors(test_img, conf_threshold=0.3)
+        detection = detector.detect_and_render(test_img, conf_threshold=0.3)
+        errors = detection.errors
 
         if errors:
             print(f"\n❌ Найдено {len(errors)} ошибок:")
@@ -130,7 +568,7 @@ if __name__ == '__main__':
         else:
             print("\n✅ Ошибок не обнаружено")
 
-        # Визуализация
-        detector.visualize_errors(test_img, 'test_result.png')
+        # Визуализация из того же прохода модели
+        detection.save_annotated('test_result.png')
     else:
         print("⚠️  Тестовые изображения не найдены")
\ No newline at end of file
@@ -1,35 +1,110 @@
-import easyocr
 import numpy as np
-from pdf2image import convert_from_path
 
-from anal import poppler_path
+import config
+from ocr_pool import get_ocr_pool
+from pdf_pages import PageRef
+from text_layer import extract_text_layer, has_text_layer
 
 
 class StampCheckerEasyOCR:
-    def __init__(self, pdf_path, dpi=300):
-        pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=poppler_path)
-        self.image = np.array(pages[0])
-        self.reader = easyocr.Reader(['ru', 'en'], gpu=False)
+    def __init__(self, source, dpi=300, ocr_pool=None):
+        """
+        Args:
+            source: изображение (numpy), PageRef или путь к PDF (первая страница)
+            ocr_pool: пул EasyOCR (по умолчанию общий пул процесса)
+        """
+        if isinstance(source, np.ndarray):
+            self.page = None
+            self._image = source
+        else:
+            self.page = source if isinstance(source, PageRef) else PageRef(source, 1, dpi)
+            # Растр нужен только сканам — берётся из кэша страниц при первом обращении
+            self._image = None
+        self.ocr_pool = ocr_pool or get_ocr_pool()
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = self.page.image()
+        return self._image
+
+    def extract_text(self, region=None):
+        """Текст области (по умолчанию штампа): из текстового слоя PDF, для сканов — EasyOCR"""
+        region = region or config.TITLE_BLOCK_REGION
+        if self.page is not None:
+            records = extract_text_layer(self.page.pdf_path, self.page.page_number,
+                                         region=region, dpi=self.page.dpi)
+            if has_text_layer(records):
+                return records
+
+        h, w = self.image.shape[:2]
+        crop = self.image[int(h * region[1]):int(h * region[3]), int(w * region[0]):int(w * region[2])]
+        return self.extract_text_easyocr(crop)
 
     def extract_text_easyocr(self, crop):
         """EasyOCR часто работает лучше Tesseract для русского"""
-        results = self.reader.readtext(crop)
-
-        formatted_results = []
-        for (bbox, text, conf) in results:
-            # bbox = [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
-            x_coords = [pt[0] for pt in bbox]
-            y_coords = [pt[1] for pt in bbox]
-
-            x = int(min(x_coords))
-            y = int(min(y_coords))
-            w = int(max(x_coords) - x)
-            h = int(max(y_coords) - y)
-
-            formatted_results.append({
-                'text': text,
-                'conf': int(conf * 100),
-                'bbox': (x, y, w, h)
-            })
-
-        return formatted_results
\ No newline at end of file
+        return quads_to_records(self.ocr_pool.readtext(crop))
+
+
+def extract_text_easyocr_batched(crops, ocr_pool=None, batch_size=None):
+    """
+    EasyOCR для множества фрагментов (например, штампов из пакетной проверки)
+
+    Фрагменты одного размера (штампы листов одного формата при одном DPI)
+    идут через readtext_batched пачками по batch_size: и детектор, и
+    распознаватель получают пачку, а не по одному фрагменту. Размеры
+    не меняются, поэтому координаты рамок не нужно пересчитывать.
+
+    Returns:
+        список записей {'text', 'conf', 'bbox'} на каждый фрагмент, по порядку
+    """
+    ocr_pool = ocr_pool or get_ocr_pool()
+    batch_size = batch_size or config.OCR_BATCH_SIZE
+
+    groups = {}
+    for index, crop in enumerate(crops):
+        groups.setdefault(crop.shape, []).append(index)
+
+    results = [None] * len(crops)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            batch = [crops[i] for i in chunk]
+            for index, crop_results in zip(chunk, ocr_pool.readtext_batched(batch, batch_size=batch_size)):
+                results[index] = crop_results
+
+    return batch_quads_to_records(results)
+
+
+def quads_to_records(results):
+    """Результат readtext ([(quad, text, conf), ...]) → записи {'text', 'conf', 'bbox'}"""
+    return batch_quads_to_records([results])[0]
+
+
+def batch_quads_to_records(batch_results):
+    """
+    То же для нескольких фрагментов: все четырёхугольники переводятся
+    в (x, y, w, h) одной операцией NumPy
+    """
+    counts = [len(results) for results in batch_results]
+    flat = [item for results in batch_results for item in results]
+    if not flat:
+        return [[] for _ in batch_results]
+
+    # quad = [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
+    quads = np.asarray([quad for quad, _, _ in flat], dtype=np.float64).reshape(-1, 4, 2)
+    xy = quads.min(axis=1).astype(np.int64)
+    wh = (quads.max(axis=1) - xy).astype(np.int64)
+    confs = (np.asarray([conf for _, _, conf in flat], dtype=np.float64) * 100).astype(np.int64)
+
+    records = [
+        {'text': text, 'conf': int(conf), 'bbox': (int(x), int(y), int(w), int(h))}
+        for (_, text, _), conf, (x, y), (w, h) in zip(flat, confs, xy, wh)
+    ]
+
+    batched = []
+    start = 0
+    for count in counts:
+        batched.append(records[start:start + count])
+        start += count
+    return batched
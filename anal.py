@@ -1,43 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-import numpy as np
-from pdf2image import convert_from_path
 import pytesseract
 import config
+from pdf_pages import count_pages, load_page
+from text_layer import extract_text_layer, has_text_layer
 
 # Используем пути из config
 pytesseract.pytesseract.tesseract_cmd = config.TESSERACT_CMD
+_subprocess_args = pytesseract.pytesseract.subprocess_args
 
 
-def analyze_document(pdf_path):
-    """Анализ документа"""
-    pages = convert_from_path(
-        pdf_path,
-        dpi=config.PDF_DPI,
-        poppler_path=config.POPPLER_PATH
-    )
+def _tesseract_subprocess_args(include_stdout=True):
+    """Окружение запуска tesseract: OMP_THREAD_LIMIT только для дочернего процесса"""
+    kwargs = _subprocess_args(include_stdout)
+    kwargs['env'] = {**(kwargs.get('env') or os.environ),
+                     'OMP_THREAD_LIMIT': str(config.TESSERACT_THREAD_LIMIT)}
+    return kwargs
+
+
+pytesseract.pytesseract.subprocess_args = _tesseract_subprocess_args
+
+
+def analyze_document(pdf_path, region=None, visualize=True):
+    """Анализ штампа первой страницы документа (см. analyze_pages)"""
+    return analyze_pages(pdf_path, [1], region=region, visualize=visualize, workers=1)[0]
+
+
+def analyze_pages(pdf_path, page_numbers=None, region=None, visualize=False, workers=None):
+    """
+    Анализ области (по умолчанию штампа) на страницах документа
+
+    Чертежи из САПР несут текстовый слой — текст читается из него за
+    миллисекунды, без растеризации. Сканы распознаются tesseract, по одному
+    запуску на страницу, страницы — параллельно в workers потоках
+    (tesseract — отдельный процесс, GIL не мешает; OpenMP внутри него
+    ограничен config.TESSERACT_THREAD_LIMIT).
+
+    Args:
+        page_numbers: номера страниц (по умолчанию все)
+        region: (x0, y0, x1, y1) в долях страницы, по умолчанию config.TITLE_BLOCK_REGION
+        visualize: рисовать рамки слов (только для OCR; пакетным задачам не нужно)
+
+    Returns:
+        список {'page', 'text', 'records', 'visualization', 'source'} по страницам
+    """
+    region = region or config.TITLE_BLOCK_REGION
+    if page_numbers is None:
+        page_numbers = range(1, count_pages(pdf_path) + 1)
+    workers = workers or config.TESSERACT_WORKERS
+
+    def run(page_number):
+        return _analyze_page(pdf_path, page_number, region, visualize)
+
+    if workers == 1:
+        return [run(page_number) for page_number in page_numbers]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tesseract') as executor:
+        return list(executor.map(run, page_numbers))
 
-    image = np.array(pages[0])
-    h, w, _ = image.shape
-    crop = image[int(h * 0.75):, int(w * 0.75):]
 
-    vis = crop.copy()
+def _analyze_page(pdf_path, page_number, region, visualize):
+    records = extract_text_layer(pdf_path, page_number, region=region)
+    if has_text_layer(records):
+        return {
+            'page': page_number,
+            'text': '\n'.join(r['text'] for r in records),
+            'records': records,
+            'visualization': None,
+            'source': 'text_layer'
+        }
+
+    image = load_page(pdf_path, page_number, dpi=config.PDF_DPI)
+    h, w, _ = image.shape
+    x0, y0, x1, y1 = region
+    crop = image[int(h * y0):int(h * y1), int(w * x0):int(w * x1)]
     gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
 
-    data = pytesseract.image_to_data(gray, output_type=pytesseract.Output.DICT)
+    records, text = ocr_words(gray)
 
-    for i in range(len(data['text'])):
-        if int(data['conf'][i]) > 0:
-            (x, y, w_box, h_box) = (
-                data['left'][i],
-                data['top'][i],
-                data['width'][i],
-                data['height'][i]
-            )
+    vis = None
+    if visualize:
+        vis = crop.copy()
+        for record in records:
+            x, y, w_box, h_box = record['bbox']
             cv2.rectangle(vis, (x, y), (x + w_box, y + h_box), (0, 255, 0), 2)
 
-    text = pytesseract.image_to_string(gray, lang='rus')
-
     return {
+        'page': page_number,
         'text': text,
-        'visualization': vis
-    }
\ No newline at end of file
+        'records': records,
+        'visualization': vis,
+        'source': 'ocr'
+    }
+
+
+def ocr_words(gray, lang=None):
+    """
+    Один запуск tesseract (image_to_data): и рамки слов, и полный текст
+
+    Текст собирается из тех же слов по блокам/абзацам/строкам так же,
+    как его выдаёт image_to_string, — второй проход разметки не нужен.
+
+    Returns:
+        (records, text): records — слова с conf > 0 в формате {'text', 'conf', 'bbox'}
+    """
+    data = pytesseract.image_to_data(gray, lang=lang or config.TESSERACT_LANG,
+                                     output_type=pytesseract.Output.DICT)
+
+    records = []
+    paragraphs = {}
+    for i in range(len(data['text'])):
+        word = data['text'][i].strip()
+        if not word:
+            continue
+
+        paragraph = paragraphs.setdefault((data['block_num'][i], data['par_num'][i]), {})
+        paragraph.setdefault(data['line_num'][i], []).append(word)
+
+        conf = int(float(data['conf'][i]))
+        if conf > 0:
+            records.append({
+                'text': word,
+                'conf': conf,
+                'bbox': (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+            })
+
+    text = '\n\n'.join(
+        '\n'.join(' '.join(words) for _, words in sorted(lines.items()))
+        for _, lines in sorted(paragraphs.items())
+    )
+    return records, text
@@ -1,21 +1,52 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, url_for, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from datetime import datetime
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_method
+from collections import Counter
+from datetime import datetime, timedelta
+import heapq
 import os
 import json
+import threading
 import time
-from GOSTErrorDetector import GOSTErrorDetector
+import uuid
+import click
+import cv2
+from PIL import Image
+import config
+from blob_store import BlobStore
+from model_registry import registry
+from batching import get_batcher, run_tiles
+from inference_pool import get_pool
+from GOSTErrorDetector import detect_tiled, render_errors
+from utils import file_sha256
+from pdf_pages import count_pages, iter_inference_pages, rasterize_page, encode_png
+from page_cache import get_page_cache
+from upload_stream import StreamingUploadRequest, save_upload
+from job_queue import JobQueue
+from progress import broker, format_sse
 
 app = Flask(__name__)
+# Файлы из формы пишутся на диск по мере приёма, с хэшем и размером
+app.request_class = StreamingUploadRequest
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = config.UPLOAD_MAX_SIZE
+# Загрузки и растры страниц хранятся по хэшу содержимого
+blob_store = BlobStore(os.path.join(UPLOAD_FOLDER, 'blobs'))
 
 # Настройка базы данных
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+MIGRATIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+migrate = Migrate(app, db, directory=MIGRATIONS_FOLDER)
 
 # ========== МОДЕЛИ ==========
 
@@ -41,14 +72,54 @@ class FileEntry(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     file_size = db.Column(db.Integer)
     file_type = db.Column(db.String(50))
+    page_count = db.Column(db.Integer, default=1)
+    # sha256 содержимого, считается при приёме загрузки
+    content_hash = db.Column(db.String(64), index=True)
+    # Метка загрузки набора файлов (поле формы session), для /analyze/batch
+    upload_session = db.Column(db.String(64), index=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     analysis_results = db.relationship('AnalysisResult', backref='file', lazy=True, cascade='all, delete-orphan')
+    pages = db.relationship('PageEntry', backref='file', lazy=True, cascade='all, delete-orphan',
+                            order_by='PageEntry.page_number')
+
+    # Пагинация списка файлов по ключу (uploaded_at, id)
+    __table_args__ = (
+        db.Index('ix_file_entry_uploaded_id', 'uploaded_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<File {self.filename}>'
 
 
+class PageEntry(db.Model):
+    """Страницы файла: растр, который проверяет модель"""
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('file_entry.id'), nullable=False, index=True)
+    page_number = db.Column(db.Integer, nullable=False)
+
+    filename = db.Column(db.String(200), nullable=False)
+    filepath = db.Column(db.String(300), nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    file_size = db.Column(db.Integer)
+    content_hash = db.Column(db.String(64))
+    # Полноразмерная копия для просмотра (RASTER_MODE='inference'), рисуется по запросу
+    display_filename = db.Column(db.String(200))
+
+    def __repr__(self):
+        return f'<Page {self.file_id}:{self.page_number}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'page': self.page_number,
+            'filename': self.filename,
+            'width': self.width,
+            'height': self.height
+        }
+
+
 class AnalysisResult(db.Model):
     """Результаты проверки чертежей"""
     id = db.Column(db.Integer, primary_key=True)
@@ -64,17 +135,105 @@ class AnalysisResult(db.Model):
 
     processing_time = db.Column(db.Float)
     model_version = db.Column(db.String(50))
+    batch_id = db.Column(db.Integer, db.ForeignKey('analysis_batch.id'), nullable=True, index=True)
 
     errors = db.relationship('DetectedError', backref='analysis', lazy=True, cascade='all, delete-orphan')
 
+    # Последний анализ файла — поиск по индексу (см. files_with_latest_analysis)
+    __table_args__ = (
+        db.Index('ix_analysis_result_file_checked', 'file_id', 'checked_at'),
+    )
+
     def __repr__(self):
         return f'<AnalysisResult {self.id} - {self.total_errors} errors>'
 
 
+class AnalysisJob(db.Model):
+    """Задача фоновой очереди анализа (см. job_queue.JobQueue)"""
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis_result.id'), nullable=False, index=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('file_entry.id'), nullable=False)
+
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    run_after = db.Column(db.DateTime)
+    lease_until = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    result = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    analysis = db.relationship('AnalysisResult', backref=db.backref('job', uselist=False))
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'analysis_id': self.analysis_id,
+            'file_id': self.file_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': json.loads(self.result) if self.result else None
+        }
+
+
+class AnalysisBatch(db.Model):
+    """Пакетный анализ набора файлов; строка — задача очереди batch_queue"""
+    id = db.Column(db.Integer, primary_key=True)
+    upload_session = db.Column(db.String(64))
+    file_count = db.Column(db.Integer, default=0)
+
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    run_after = db.Column(db.DateTime)
+    lease_until = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    result = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    analyses = db.relationship('AnalysisResult', backref='batch', lazy=True, order_by='AnalysisResult.id')
+
+    def __repr__(self):
+        return f'<AnalysisBatch {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'batch_id': self.id,
+            'upload_session': self.upload_session,
+            'file_count': self.file_count,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': json.loads(self.result) if self.result else None
+        }
+
+
 class DetectedError(db.Model):
     """Найденные ошибки на чертежах"""
     id = db.Column(db.Integer, primary_key=True)
     analysis_id = db.Column(db.Integer, db.ForeignKey('analysis_result.id'), nullable=False)
+    page_id = db.Column(db.Integer, db.ForeignKey('page_entry.id'), nullable=True)
+    page_number = db.Column(db.Integer, default=1)
 
     error_type = db.Column(db.String(100), nullable=False)
     error_category = db.Column(db.String(100))
@@ -88,11 +247,28 @@ class DetectedError(db.Model):
     bbox_width = db.Column(db.Integer)
     bbox_height = db.Column(db.Integer)
 
+    # Уверенность модели: храним все кандидаты выше config.DETECTION_CONF_FLOOR,
+    # а порог применяем при запросе
+    confidence = db.Column(db.Float)
+
     extra_data = db.Column(db.Text)
 
     is_fixed = db.Column(db.Boolean, default=False)
     fixed_at = db.Column(db.DateTime, nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_detected_error_analysis_confidence', 'analysis_id', 'confidence'),
+    )
+
+    @hybrid_method
+    def passes_confidence(self, min_conf):
+        """Ошибка проходит порог (старые записи без confidence не отсекаются)"""
+        return self.confidence is None or self.confidence >= min_conf
+
+    @passes_confidence.expression
+    def passes_confidence(cls, min_conf):
+        return db.or_(cls.confidence.is_(None), cls.confidence >= min_conf)
+
     def __repr__(self):
         return f'<Error {self.error_type} - {self.severity}>'
 
@@ -100,6 +276,7 @@ class DetectedError(db.Model):
         """Преобразование в словарь для JSON"""
         return {
             'id': self.id,
+            'page': self.page_number,
             'type': self.error_type,
             'category': self.error_category,
             'severity': self.severity,
@@ -111,22 +288,172 @@ class DetectedError(db.Model):
                 'width': self.bbox_width,
                 'height': self.bbox_height
             } if self.bbox_x is not None else None,
+            'confidence': self.confidence,
             'is_fixed': self.is_fixed,
             'extra_data': json.loads(self.extra_data) if self.extra_data else None
         }
 
 
-# Создание таблиц
+class CachedDetection(db.Model):
+    """Кэш результатов детекции по содержимому страницы"""
+    id = db.Column(db.Integer, primary_key=True)
+    page_hash = db.Column(db.String(64), nullable=False)
+    model_version = db.Column(db.String(50), nullable=False)
+    conf_threshold = db.Column(db.Float, nullable=False)
+
+    detections = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    hit_count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('page_hash', 'model_version', 'conf_threshold', name='uq_cached_detection_key'),
+    )
+
+    def __repr__(self):
+        return f'<CachedDetection {self.page_hash[:12]} {self.model_version}>'
+
+
+class StoredBlob(db.Model):
+    """Блоб в хранилище загрузок и число ссылающихся на него записей"""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(80), unique=True, nullable=False)
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Blob {self.key[:12]} refs={self.ref_count}>'
+
+
+class StatTotal(db.Model):
+    """
+    Материализованные итоги для /statistics
+
+    metric — files, analyses, errors (ошибки с уверенностью не ниже
+    config.DEFAULT_MIN_CONF), fixed (из них исправленные), cache_entries
+    и cache_hits (записи кэша результатов и попадания в них, только
+    итоги, без дней); dimension — total, category, severity или type,
+    key — значение измерения
+    ('' для total). Обновляются в транзакции с данными (record_stats),
+    пересчитываются командой flask rebuild-stats.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(20), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(100), nullable=False, default='')
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'dimension', 'key', name='uq_stat_total_key'),
+    )
+
+
+class StatDaily(db.Model):
+    """Те же счётчики по дням (UTC) — для трендов /statistics?bucket="""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    metric = db.Column(db.String(20), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(100), nullable=False, default='')
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'metric', 'dimension', 'key', name='uq_stat_daily_key'),
+    )
+
+
+def acquire_blob(key, size=None):
+    """Ещё одна ссылка на блоб (строка создаётся при первой)"""
+    blob = StoredBlob.query.filter_by(key=key).first()
+    if blob is None:
+        try:
+            # Та же загрузка могла параллельно прийти от другого пользователя
+            with db.session.begin_nested():
+                db.session.add(StoredBlob(key=key, size=size, ref_count=1))
+            return
+        except IntegrityError:
+            blob = StoredBlob.query.filter_by(key=key).first()
+    blob.ref_count = StoredBlob.ref_count + 1
+
+
+def _release_blobs(connection, keys):
+    table = StoredBlob.__table__
+    for key in keys:
+        if key:
+            connection.execute(
+                table.update().where(table.c.key == key).values(ref_count=table.c.ref_count - 1)
+            )
+
+
+@event.listens_for(FileEntry, 'after_delete')
+def release_file_blob(mapper, connection, target):
+    _release_blobs(connection, [blob_store.key_for_path(target.filepath)])
+
+
+@event.listens_for(PageEntry, 'after_delete')
+def release_page_blobs(mapper, connection, target):
+    display_key = target.display_filename if BlobStore.is_key(target.display_filename) else None
+    _release_blobs(connection, [blob_store.key_for_path(target.filepath), display_key])
+
+
+def create_schema():
+    """Новая БД: таблицы по моделям и отметка последней ревизии миграций"""
+    script = ScriptDirectory(MIGRATIONS_FOLDER)
+    with db.engine.begin() as connection:
+        db.metadata.create_all(connection)
+        MigrationContext.configure(connection).stamp(script, script.get_current_head())
+
+
+# Создание таблиц. Существующая БД обновляется только миграциями
+# (flask db upgrade): create_all не меняет уже созданные таблицы,
+# а созданные им новые помешали бы ревизиям, которые их добавляют
 with app.app_context():
-    db.create_all()
+    if not db.inspect(db.engine).has_table('file_entry'):
+        create_schema()
+
+_inference_started = False
+_inference_lock = threading.Lock()
+
+
+def start_inference():
+    """
+    Загрузка модели один раз на процесс с прогревом в фоне
+    (или запуск реплик пула, если он включён)
+
+    Не при импорте: реплики пула стартуют через spawn и заново
+    импортируют __main__, так что при `python app.py` пул, созданный
+    на уровне модуля, создавался бы до окончания загрузки процесса.
+    """
+    global _inference_started
+    with _inference_lock:
+        if _inference_started or not os.path.exists(config.MODEL_WEIGHTS):
+            return
+        _inference_started = True
+
+    if config.INFERENCE_REPLICAS > 0:
+        get_pool()
+    else:
+        registry.warmup_async(config.MODEL_WEIGHTS)
 
 
 # ========== API ENDPOINTS ==========
 
 @app.route('/')
 def index():
-    files = FileEntry.query.order_by(FileEntry.uploaded_at.desc()).all()
-    return render_template('index.html', files=files)
+    try:
+        files, next_cursor = files_with_latest_analysis(**get_file_filters())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    next_url = url_for('index', **{**request.args, 'cursor': next_cursor}) if next_cursor else None
+    return render_template('index.html', files=files, next_url=next_url, job_poll_ms=config.JOB_STATUS_POLL_MS)
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'File too large (limit {limit_mb} MB)'}), 413
 
 
 @app.route('/upload', methods=['POST'])
@@ -138,92 +465,574 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    if file:
-        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filepath)
+    # Владелец файла (для потока /users/<id>/events); без авторизации — из формы
+    user_id = request.form.get('user_id', type=int)
+    if user_id is not None and db.session.get(User, user_id) is None:
+        return jsonify({'error': f'User {user_id} not found'}), 400
 
-        file_size = os.path.getsize(filepath)
+    if file:
         file_type = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'unknown'
 
-        final_filepath = filepath
-        final_filename = file.filename
+        # Размер и хэш посчитаны при приёме, файл на диске не перечитывается;
+        # в хранилище он кладётся под своим хэшем, повторная загрузка не копируется
+        staging_path = os.path.join(UPLOAD_FOLDER, f'.incoming-{uuid.uuid4().hex}')
+        file_size, content_hash = save_upload(file, staging_path)
+        blob_key, filepath, created = blob_store.put_file(
+            staging_path, content_hash, file_type if file_type != 'unknown' else ''
+        )
+        acquire_blob(blob_key, file_size)
+        if not created:
+            print(f"♻️  Файл уже в хранилище: {file.filename} ({content_hash[:12]})")
+
+        new_entry = FileEntry(
+            filename=file.filename,
+            filepath=filepath,
+            file_size=file_size,
+            file_type=file_type,
+            content_hash=content_hash,
+            upload_session=request.form.get('session') or None,
+            user_id=user_id
+        )
+        db.session.add(new_entry)
 
         if file_type == 'pdf':
             try:
-                from pdf2image import convert_from_path
-                import config
-
                 print(f"📄 Конвертация PDF в PNG: {file.filename}")
-
-                pages = convert_from_path(
-                    filepath,
-                    dpi=config.PDF_DPI,
-                    poppler_path=config.POPPLER_PATH
-                )
-
-                png_filename = file.filename.rsplit('.', 1)[0] + '.png'
-                png_filepath = os.path.join(UPLOAD_FOLDER, png_filename)
-                pages[0].save(png_filepath, 'PNG')
-
-                final_filepath = png_filepath
-                final_filename = png_filename
-                file_type = 'png'
-                file_size = os.path.getsize(png_filepath)
-
-                print(f"✅ Конвертировано: {png_filename}")
+                db.session.flush()
+                add_pdf_pages(new_entry)
+                print(f"✅ Конвертировано страниц: {new_entry.page_count}")
 
             except Exception as e:
+                db.session.rollback()
                 print(f"❌ Ошибка конвертации PDF: {str(e)}")
                 return jsonify({'error': f'PDF conversion failed: {str(e)}'}), 500
+        else:
+            ensure_pages(new_entry)
 
-        new_entry = FileEntry(
-            filename=final_filename,
-            filepath=final_filepath,
-            file_size=file_size,
-            file_type=file_type,
-            user_id=None
-        )
-        db.session.add(new_entry)
+        record_stats(datetime.utcnow().date(), {('files', 'total', ''): 1})
         db.session.commit()
 
         return jsonify({
             'message': 'File uploaded successfully',
             'file_id': new_entry.id,
-            'filename': final_filename,
+            'filename': new_entry.filename,
             'file_type': file_type,
-            'path': final_filepath,
-            'converted_from_pdf': file.filename.endswith('.pdf')
+            'path': new_entry.filepath,
+            'page_count': new_entry.page_count,
+            'pages': [page.to_dict() for page in new_entry.pages],
+            'converted_from_pdf': file_type == 'pdf',
+            'deduplicated': not created,
+            'upload_session': new_entry.upload_session
         }), 200
 
 
+def add_pdf_pages(file_entry):
+    """
+    Растеризует PDF постранично: на диск и в БД, в памяти — одна страница
+
+    В режиме RASTER_MODE='inference' страница сразу рисуется в оттенках
+    серого под вход детектора; размеры страницы в БД — размеры этого растра,
+    в его пикселях хранятся и рамки ошибок.
+    """
+    page_count = 0
+    # Число листов для событий прогресса — только если их кто-то слушает
+    total_pages = count_pages(file_entry.filepath) if broker.subscribers() else None
+
+    for page_number, image in iter_inference_pages(file_entry.filepath):
+        if total_pages:
+            broker.publish({'file_id': file_entry.id, 'user_id': file_entry.user_id,
+                            'stage': 'rasterizing', 'page': page_number, 'pages': total_pages})
+        png_data = encode_png(image)
+        png_key, png_filepath, png_hash, _ = blob_store.put_bytes(png_data, '.png')
+        acquire_blob(png_key, len(png_data))
+
+        file_entry.pages.append(PageEntry(
+            page_number=page_number,
+            filename=png_key,
+            filepath=png_filepath,
+            width=image.width,
+            height=image.height,
+            file_size=len(png_data),
+            content_hash=png_hash
+        ))
+        image.close()
+        page_count += 1
+
+    file_entry.page_count = page_count
+
+
+def ensure_pages(file_entry):
+    """Страницы файла; для изображений (и файлов, загруженных до постраничного режима) — сам файл"""
+    if not file_entry.pages:
+        blob_key = blob_store.key_for_path(file_entry.filepath)
+        if blob_key:
+            acquire_blob(blob_key, file_entry.file_size)
+
+        # Хэш и размеры — сразу, как у страниц PDF: иначе кэш результатов
+        # хэшировал бы файл при каждом анализе
+        width, height = image_size(file_entry.filepath)
+        file_entry.pages.append(PageEntry(
+            page_number=1,
+            filename=os.path.basename(file_entry.filepath),
+            filepath=file_entry.filepath,
+            width=width,
+            height=height,
+            file_size=file_entry.file_size,
+            content_hash=file_entry.content_hash or file_sha256(file_entry.filepath)
+        ))
+        file_entry.page_count = 1
+    return file_entry.pages
+
+
+def image_size(path):
+    """(ширина, высота) изображения по заголовку файла или (None, None), если это не изображение"""
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except (OSError, ValueError):
+        return None, None
+
+
+def upload_path(filename):
+    """Путь к файлу загрузки: ключ хранилища или (для старых загрузок) имя в uploads/"""
+    if BlobStore.is_key(filename):
+        return blob_store.path_for(filename)
+    return os.path.join(UPLOAD_FOLDER, filename)
+
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
+    if BlobStore.is_key(filename):
+        path = blob_store.path_for(filename)
+        if not os.path.exists(path):
+            return jsonify({'error': 'File not found'}), 404
+        # Содержимое по ключу не меняется
+        return send_file(os.path.abspath(path), max_age=365 * 24 * 3600)
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 
+@app.route('/pages/<int:page_id>/display.png')
+def page_display(page_id):
+    """
+    Изображение страницы для просмотра
+
+    Растр под детектор слишком мелкий для глаза, поэтому полноразмерная
+    копия (PDF_DPI, цвет) рисуется из PDF при первом открытии и сохраняется.
+    """
+    page = PageEntry.query.get_or_404(page_id)
+    file_entry = page.file
+
+    if file_entry.file_type != 'pdf' or config.RASTER_MODE != 'inference':
+        return uploaded_file(page.filename)
+
+    if not page.display_filename or not os.path.exists(upload_path(page.display_filename)):
+        image = rasterize_page(file_entry.filepath, page.page_number, dpi=config.PDF_DPI, cache=True)
+        png_data = encode_png(image)
+        image.close()
+
+        display_key, _, _, _ = blob_store.put_bytes(png_data, '.png')
+        if display_key != page.display_filename:
+            acquire_blob(display_key, len(png_data))
+            page.display_filename = display_key
+        db.session.commit()
+
+    return uploaded_file(page.display_filename)
+
+
 @app.route('/analyze/<int:file_id>', methods=['POST'])
 def analyze_file(file_id):
-    file_entry = FileEntry.query.get_or_404(file_id)
+    """Ставит анализ файла в очередь; статус — /jobs/<job_id>"""
+    FileEntry.query.get_or_404(file_id)
+    try:
+        model_version = current_model_version()
+    except FileNotFoundError:
+        return model_unavailable()
 
     analysis = AnalysisResult(
         file_id=file_id,
-        status='in_progress',
-        model_version='v1.0'
+        status='queued',
+        model_version=model_version
     )
     db.session.add(analysis)
-    db.session.commit()
+    db.session.flush()
+    job = job_queue.enqueue(analysis_id=analysis.id, file_id=file_id)
+
+    if job_queue.workers == 0:
+        # Очередь без рабочих потоков: анализ в самом запросе
+        result = job_queue.run_inline(job)
+        if result is None:
+            return jsonify({'error': job.error, 'job_id': job.id}), 500
+        return jsonify({'message': 'Analysis completed', 'job_id': job.id, **result}), 200
+
+    return jsonify({
+        'message': 'Analysis queued',
+        'analysis_id': analysis.id,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.id),
+        'events_url': url_for('analysis_events', analysis_id=analysis.id)
+    }), 202
+
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Пакетный анализ: {"file_ids": [...]} или {"session": "<метка загрузки>"}
+
+    Весь набор — одна задача очереди; статус и сводка — /batches/<batch_id>
+    """
+    data = request.get_json(silent=True) or {}
+    session = data.get('session')
+
+    if session:
+        files = FileEntry.query.filter_by(upload_session=session).order_by(FileEntry.id).all()
+    else:
+        file_ids = data.get('file_ids')
+        if not isinstance(file_ids, list) or not all(isinstance(i, int) for i in file_ids):
+            return jsonify({'error': 'Expected "file_ids" (list of ids) or "session"'}), 400
+        files = FileEntry.query.filter(FileEntry.id.in_(file_ids)).order_by(FileEntry.id).all()
+        missing = set(file_ids) - {file.id for file in files}
+        if missing:
+            return jsonify({'error': 'Files not found', 'missing': sorted(missing)}), 404
+
+    if not files:
+        return jsonify({'error': 'No files to analyze'}), 400
+    if len(files) > config.BATCH_MAX_FILES:
+        return jsonify({'error': f'Too many files (limit {config.BATCH_MAX_FILES})'}), 400
 
     try:
-        start_time = time.time()
+        model_version = current_model_version()
+    except FileNotFoundError:
+        return model_unavailable()
+    analyses = [AnalysisResult(file_id=file.id, status='queued', model_version=model_version)
+                for file in files]
+    batch = batch_queue.enqueue(upload_session=session, file_count=len(files), analyses=analyses)
+
+    if batch_queue.workers == 0:
+        result = batch_queue.run_inline(batch)
+        if result is None:
+            return jsonify({'error': batch.error, 'batch_id': batch.id}), 500
+        return jsonify({'message': 'Batch analysis completed', **result}), 200
+
+    return jsonify({
+        'message': 'Batch analysis queued',
+        'batch_id': batch.id,
+        'files': len(files),
+        'status': batch.status,
+        'status_url': url_for('batch_status', batch_id=batch.id)
+    }), 202
+
+
+@app.route('/batches/<int:batch_id>')
+def batch_status(batch_id):
+    """Статус пакетного анализа: файлы по статусам, после завершения — сводка"""
+    batch = AnalysisBatch.query.get_or_404(batch_id)
+    statuses = db.session.query(AnalysisResult.status, db.func.count(AnalysisResult.id)) \
+        .filter_by(batch_id=batch_id).group_by(AnalysisResult.status).all()
+    return jsonify({**batch.to_dict(), 'files_by_status': dict(statuses)}), 200
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """Статус задачи анализа (опрашивается index.html)"""
+    job = AnalysisJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict()), 200
+
+
+def model_unavailable():
+    """Ответ на анализ без файла весов: модель ещё не обучена"""
+    return jsonify({'error': 'Model weights not found, train the model first',
+                    'model': os.path.basename(config.MODEL_WEIGHTS)}), 503
+
+
+def current_model_version(weights_version=None):
+    """
+    Версия результатов модели — ключ кэша результатов
+
+    Версия весов (по умолчанию — текущего файла) и параметры тайлинга:
+    они тоже меняют найденные ошибки. Модель запускается один раз
+    с низким порогом, фильтрация — при запросе, поэтому порог в версию
+    не входит.
+    """
+    model_version = weights_version or registry.weights_version(config.MODEL_WEIGHTS)
+    if config.TILED_INFERENCE:
+        model_version += (f'-tiled{config.TILE_SIZE}o{config.TILE_OVERLAP}'
+                          f'm{config.TILE_MERGE_THRESHOLD}{"f" if config.TILE_FULL_PASS else ""}')
+    return model_version
+
+
+def process_analysis_job(job, context):
+    """Обработчик очереди: анализ без коммита (коммитит очередь вместе со статусом)"""
+    return run_analysis(job.analysis, context)
+
+
+def set_analysis_status(job, status):
+    job.analysis.status = status
 
-        detector = GOSTErrorDetector('models/best.pt')
-        detected_errors = detector.detect_errors(file_entry.filepath, conf_threshold=0.25)
 
-        severity_counts = {'critical': 0, 'high': 0, 'medium': 0, 'low': 0}
+def process_analysis_batch(batch, context):
+    """Обработчик очереди пакетов: файлы коммитятся по одному, сводку сохраняет очередь"""
+    return run_analysis_batch(batch, context)
 
-        for err in detected_errors:
+
+def set_batch_status(batch, status):
+    # Повтор или окончательный сбой пакета касается только непроверенных файлов
+    if status in ('queued', 'failed'):
+        for analysis in batch.analyses:
+            if analysis.status != 'completed':
+                analysis.status = status
+
+
+def publish_analysis_status(job, status):
+    """Событие о смене статуса — после коммита, когда результат уже виден в БД"""
+    event = {'analysis_id': job.analysis_id, 'file_id': job.file_id, 'user_id': job.analysis.file.user_id,
+             'job_id': job.id, 'stage': status, 'status': status, 'attempt': job.attempts}
+    if status == 'completed':
+        event['result'] = json.loads(job.result)
+    elif job.error:
+        event['error'] = job.error
+    broker.publish(event)
+
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+@app.route('/analyses/<int:analysis_id>/events')
+def analysis_events(analysis_id):
+    """SSE-поток хода одного анализа; закрывается после completed/failed"""
+    analysis = AnalysisResult.query.get_or_404(analysis_id)
+    return analyses_event_stream([analysis])
+
+
+@app.route('/analyses/events')
+def analyses_events():
+    """
+    Общий SSE-поток хода нескольких анализов (?ids=1,2,3)
+
+    Странице с десятком незавершённых анализов хватает одного соединения:
+    браузер держит не больше ~6 соединений на сервер, а каждый поток
+    занимает поток Flask до конца задачи. Поток закрывается, когда все
+    анализы завершены.
+    """
+    try:
+        analysis_ids = {int(value) for value in request.args.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of analysis ids'}), 400
+    if not analysis_ids:
+        return jsonify({'error': 'No analysis ids'}), 400
+    if len(analysis_ids) > config.PROGRESS_MAX_STREAM_ANALYSES:
+        return jsonify({'error': f'Too many analyses (limit {config.PROGRESS_MAX_STREAM_ANALYSES})'}), 400
+
+    analyses = AnalysisResult.query.filter(AnalysisResult.id.in_(analysis_ids)).all()
+    if not analyses:
+        return jsonify({'error': 'Analyses not found'}), 404
+    return analyses_event_stream(analyses)
+
+
+def analyses_event_stream(analyses):
+    """
+    SSE-ответ с событиями набора анализов; закрывается, когда все завершены
+
+    Уже завершённые анализы отдаются итоговым событием сразу. События
+    приходят от очереди задач этого процесса; если задачу взял другой
+    процесс сервера, итоговый статус всё равно придёт: на каждом keepalive
+    статусы незавершённых анализов сверяются с БД одним запросом.
+    """
+    def final_event(analysis_id, file_id, status):
+        return format_sse({'analysis_id': analysis_id, 'file_id': file_id, 'stage': status, 'status': status})
+
+    finished = [final_event(a.id, a.file_id, a.status) for a in analyses if a.status in TERMINAL_STATUSES]
+    pending = {a.id for a in analyses if a.status not in TERMINAL_STATUSES}
+    if not pending:
+        return sse_response(iter(finished))
+
+    subscription = broker.subscribe(analysis_ids=pending)
+
+    def stream():
+        try:
+            yield from finished
+            while pending:
+                event = subscription.get(timeout=config.PROGRESS_KEEPALIVE)
+                if event is None:
+                    with app.app_context():
+                        rows = db.session.query(
+                            AnalysisResult.id, AnalysisResult.file_id, AnalysisResult.status
+                        ).filter(AnalysisResult.id.in_(pending),
+                                 AnalysisResult.status.in_(TERMINAL_STATUSES)).all()
+                    for analysis_id, file_id, status in rows:
+                        pending.discard(analysis_id)
+                        yield final_event(analysis_id, file_id, status)
+                    if pending:
+                        yield ': keepalive\n\n'
+                    continue
+
+                yield format_sse(event)
+                if event.get('stage') in TERMINAL_STATUSES:
+                    pending.discard(event['analysis_id'])
+        finally:
+            broker.unsubscribe(subscription)
+
+    return sse_response(stream())
+
+
+@app.route('/users/<int:user_id>/events')
+def user_events(user_id):
+    """
+    SSE-поток событий всех анализов и загрузок пользователя
+
+    Владелец файла задаётся при загрузке полем формы user_id.
+    """
+    User.query.get_or_404(user_id)
+    subscription = broker.subscribe(user_id=user_id)
+
+    def stream():
+        try:
+            while True:
+                event = subscription.get(timeout=config.PROGRESS_KEEPALIVE)
+                yield format_sse(event) if event is not None else ': keepalive\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    return sse_response(stream())
+
+
+def sse_response(stream):
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # nginx не должен буферизовать поток
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def run_analysis(analysis, context=None):
+    """
+    Прогон модели по всем страницам файла и запись ошибок в сессию
+
+    Returns:
+        сводка анализа (dict)
+    """
+    file_entry = analysis.file
+    conf_threshold = config.DETECTION_CONF_FLOOR
+    start_time = time.time()
+
+    def report(stage, **info):
+        broker.publish({'analysis_id': analysis.id, 'file_id': file_entry.id,
+                        'user_id': file_entry.user_id, 'stage': stage, **info})
+
+    # Версия на момент запуска, а не постановки в очередь: веса могли смениться
+    analysis.model_version = current_model_version()
+    pages = ensure_pages(file_entry)
+    lookup = lookup_cached_pages(pages, analysis.model_version, conf_threshold)
+    page_errors, cached_pages, _, pending = lookup
+    page_versions = {}
+    tiling_stats = {}
+
+    if cached_pages:
+        print(f"⚡ Из кэша: {len(cached_pages)}/{len(pages)} страниц {file_entry.filename}")
+    report('cache', cached=len(cached_pages), pages=len(pages))
+
+    if config.TILED_INFERENCE:
+        for done, (page, _) in enumerate(pending, 1):
+            if context:
+                context.check()
+            page_errors[page.id], tiling_stats[page.page_number], page_versions[page.id] = \
+                detect_page_tiled(page.filepath, conf_threshold)
+            report('inference', page=page.page_number, done=done, pages=len(pending))
+    elif pending:
+        # Все страницы уходят в общий батч (вместе с параллельными запросами);
+        # результаты забираем по мере готовности, сообщая о каждой странице
+        batcher = get_batcher()
+        futures = [batcher.submit(page.filepath, conf_threshold) for page, _ in pending]
+        for done, ((page, _), future) in enumerate(zip(pending, futures), 1):
+            page_errors[page.id] = future.result(timeout=context.remaining() if context else None)
+            page_versions[page.id] = current_model_version(future.model_version)
+            report('inference', page=page.page_number, done=done, pages=len(pending))
+
+    if context:
+        context.check()
+    report('persisting')
+
+    return save_analysis(analysis, pages, lookup, start_time, tiling_stats, page_versions)
+
+
+def detect_page_tiled(image_path, conf_threshold):
+    """
+    Тайловая детекция страницы на бэкенде инференса (реплики пула или модель процесса)
+
+    Returns:
+        (ошибки, статистика тайлинга, версия результатов)
+    """
+    versions = set()
+
+    def run(crops, conf, tile_size):
+        boxes, weights_version = run_tiles(crops, conf, tile_size)
+        versions.add(weights_version)
+        return boxes
+
+    errors, stats = detect_tiled(image_path, run, conf_threshold, return_stats=True)
+    if len(versions) > 1:
+        # Тайлы одной страницы проверены разными весами — результат не кэшируем
+        raise RuntimeError('Веса модели сменились во время анализа страницы')
+    return errors, stats, current_model_version(versions.pop() if versions else None)
+
+
+def lookup_cached_pages(pages, model_version, conf_threshold):
+    """
+    Сначала кэш: одинаковые страницы не гоняем через модель повторно
+
+    Returns:
+        (page_errors, cached_pages, cache_entries, pending): ошибки найденных
+        в кэше страниц по page.id, их id, записи кэша и список (page, page_hash)
+        страниц для модели
+    """
+    page_errors = {}
+    cached_pages = set()
+    cache_entries = []
+    pending = []
+    for page in pages:
+        if not page.content_hash:
+            # Страницы, созданные без хэша (старые загрузки), хэшируются один раз
+            page.content_hash = file_sha256(page.filepath)
+        page_hash = page.content_hash
+        cached = get_cached_detections(page_hash, model_version, conf_threshold)
+        if cached is not None:
+            page_errors[page.id] = json.loads(cached.detections)
+            cached_pages.add(page.id)
+            cache_entries.append(cached)
+        else:
+            pending.append((page, page_hash))
+    return page_errors, cached_pages, cache_entries, pending
+
+
+def save_analysis(analysis, pages, lookup, start_time, tiling_stats=None, page_versions=None):
+    """
+    Записывает ошибки страниц и итоги анализа в сессию (без коммита), возвращает сводку
+
+    page_versions — версия модели, которой на самом деле проверена каждая
+    страница (page.id → версия); под ней результат и попадает в кэш.
+    """
+    page_errors, cached_pages, cache_entries, pending = lookup
+    conf_threshold = config.DETECTION_CONF_FLOOR
+    page_versions = page_versions or {}
+
+    touch_cached_detections(cache_entries)
+    for page, page_hash in pending:
+        model_version = page_versions.get(page.id, analysis.model_version)
+        store_cached_detections(page_hash, model_version, conf_threshold, page_errors[page.id])
+        analysis.model_version = model_version
+
+    severity_counts = {'critical': 0, 'high': 0, 'medium': 0, 'low': 0}
+    pages_summary = []
+    candidates = 0
+    stats = Counter({('analyses', 'total', ''): 1})
+
+    for page in pages:
+        page_total = 0
+        for err in page_errors[page.id]:
             detected_error = DetectedError(
                 analysis_id=analysis.id,
+                page_id=page.id,
+                page_number=page.page_number,
                 error_type=err['type'],
                 error_category='auto_detected',
                 severity=err['severity'],
@@ -233,34 +1042,272 @@ def analyze_file(file_id):
                 bbox_y=err['bbox']['y'],
                 bbox_width=err['bbox']['width'],
                 bbox_height=err['bbox']['height'],
-                extra_data=json.dumps({'confidence': err['confidence']})
+                confidence=err['confidence']
             )
             db.session.add(detected_error)
-            severity_counts[err['severity']] += 1
+            if err['confidence'] >= config.DEFAULT_MIN_CONF:
+                severity_counts[err['severity']] += 1
+                page_total += 1
+                stats.update(error_stat_keys('errors', err['type'], 'auto_detected', err['severity']))
+
+        candidates += len(page_errors[page.id])
+        pages_summary.append({
+            'page': page.page_number,
+            'total_errors': page_total,
+            'candidates': len(page_errors[page.id]),
+            'cached': page.id in cached_pages
+        })
 
-        processing_time = time.time() - start_time
-        analysis.status = 'completed'
-        analysis.total_errors = len(detected_errors)
-        analysis.critical_errors = severity_counts['critical']
-        analysis.high_errors = severity_counts['high']
-        analysis.medium_errors = severity_counts['medium']
-        analysis.low_errors = severity_counts['low']
-        analysis.processing_time = processing_time
+    # Итоги анализа считаются по порогу по умолчанию
+    processing_time = time.time() - start_time
+    analysis.checked_at = datetime.utcnow()
+    analysis.total_errors = sum(severity_counts.values())
+    analysis.critical_errors = severity_counts['critical']
+    analysis.high_errors = severity_counts['high']
+    analysis.medium_errors = severity_counts['medium']
+    analysis.low_errors = severity_counts['low']
+    analysis.processing_time = processing_time
+    record_stats(analysis.checked_at.date(), stats)
+
+    return {
+        'analysis_id': analysis.id,
+        'total_errors': analysis.total_errors,
+        'errors_by_severity': severity_counts,
+        'candidates': candidates,
+        'processing_time': round(processing_time, 2),
+        'cached': len(cached_pages) == len(pages),
+        'pages': pages_summary,
+        'tiling': tiling_stats or None
+    }
 
-        db.session.commit()
 
-        return jsonify({
-            'message': 'Analysis completed',
-            'analysis_id': analysis.id,
-            'total_errors': analysis.total_errors,
-            'errors_by_severity': severity_counts,
-            'processing_time': round(processing_time, 2)
-        }), 200
+def run_analysis_batch(batch, context=None):
+    """
+    Анализ набора файлов: страницы всех файлов — в общие батчи модели
+
+    Все страницы отправляются в батчер сразу, поэтому батчи набираются
+    полными, а с пулом реплик (INFERENCE_REPLICAS) идут на все ядра
+    параллельно; одинаковые страницы прогоняются один раз. Результаты
+    каждого файла коммитятся своей транзакцией по мере готовности, ошибка
+    одного файла не останавливает остальные. При повторе задачи уже
+    проверенные файлы пропускаются.
+
+    Returns:
+        сводка набора (dict)
+    """
+    conf_threshold = config.DETECTION_CONF_FLOOR
+    start_time = time.time()
+    model_version = current_model_version()
+    batcher = None if config.TILED_INFERENCE else get_batcher()
+
+    # Постановка: кэш и отправка в батчер страниц всех файлов
+    plans = []
+    futures = {}
+    for analysis in batch.analyses:
+        if analysis.status == 'completed':
+            continue
+        analysis.model_version = model_version
+        pages = ensure_pages(analysis.file)
+        lookup = lookup_cached_pages(pages, model_version, conf_threshold)
+        if batcher is not None:
+            for page, page_hash in lookup[3]:
+                if page_hash not in futures:
+                    futures[page_hash] = batcher.submit(page.filepath, conf_threshold)
+        analysis.status = 'in_progress'
+        plans.append((analysis, pages, lookup))
+    # Не держим блокировку записи SQLite, пока работает модель
+    db.session.commit()
+
+    slowest = []
+    failures = []
+    for analysis, pages, lookup in plans:
+        if context:
+            context.check()
+        file_entry = analysis.file
+        page_errors, _, _, pending = lookup
+        page_versions = {}
+        tiling_stats = {}
+        try:
+            for page, page_hash in pending:
+                if batcher is None:
+                    page_start = time.time()
+                    page_errors[page.id], tiling_stats[page.page_number], page_versions[page.id] = \
+                        detect_page_tiled(page.filepath, conf_threshold)
+                    seconds = time.time() - page_start
+                else:
+                    future = futures[page_hash]
+                    page_errors[page.id] = future.result(timeout=context.remaining() if context else None)
+                    seconds = future.inference_seconds
+                    page_versions[page.id] = current_model_version(future.model_version)
+                slowest.append((seconds, file_entry.id, file_entry.filename, page.page_number))
+
+            summary = save_analysis(analysis, pages, lookup, start_time, tiling_stats, page_versions)
+            analysis.status = 'completed'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # Истёк срок всей задачи — её повторит очередь
+            if context:
+                context.check()
+            analysis.status = 'failed'
+            db.session.commit()
+            error = f'{type(e).__name__}: {e}'
+            failures.append({'file_id': file_entry.id, 'filename': file_entry.filename, 'error': error})
+            print(f"❌ Пакет {batch.id}: {file_entry.filename}: {error}")
+            broker.publish({'analysis_id': analysis.id, 'file_id': file_entry.id, 'user_id': file_entry.user_id,
+                            'batch_id': batch.id, 'stage': 'failed', 'status': 'failed', 'error': error})
+            continue
+
+        broker.publish({'analysis_id': analysis.id, 'file_id': file_entry.id, 'user_id': file_entry.user_id,
+                        'batch_id': batch.id, 'stage': 'completed', 'status': 'completed', 'result': summary})
+
+    return summarize_batch(batch, futures, slowest, failures, time.time() - start_time)
+
+
+def summarize_batch(batch, futures, slowest, failures, processing_time):
+    """Сводка набора: итоги по всем файлам (и проверенным в прошлых попытках)"""
+    severity_counts = {'critical': 0, 'high': 0, 'medium': 0, 'low': 0}
+    statuses = Counter()
+    for analysis in batch.analyses:
+        statuses[analysis.status] += 1
+        if analysis.status == 'completed':
+            severity_counts['critical'] += analysis.critical_errors
+            severity_counts['high'] += analysis.high_errors
+            severity_counts['medium'] += analysis.medium_errors
+            severity_counts['low'] += analysis.low_errors
+
+    pages = sum(analysis.file.page_count or 1 for analysis in batch.analyses)
+    return {
+        'batch_id': batch.id,
+        'files': len(batch.analyses),
+        'completed': statuses['completed'],
+        'failed': statuses['failed'],
+        'pages': pages,
+        'inferred_pages': len(futures) if futures else len(slowest),
+        'total_errors': sum(severity_counts.values()),
+        'errors_by_severity': severity_counts,
+        'processing_time': round(processing_time, 2),
+        'slowest_pages': [
+            {'file_id': file_id, 'filename': filename, 'page': page, 'seconds': round(seconds, 3)}
+            for seconds, file_id, filename, page in heapq.nlargest(config.BATCH_SLOWEST_PAGES, slowest)
+        ],
+        'failures': failures
+    }
+
+
+# Счётчики кэша результатов с момента запуска процесса
+result_cache_counters = {'hits': 0, 'misses': 0}
+
+
+def get_cached_detections(page_hash, model_version, conf_threshold):
+    """
+    Запись кэша для страницы или None при промахе
+
+    В БД ничего не пишет: отметку об использовании ставит
+    touch_cached_detections в одной транзакции с результатами, чтобы
+    во время инференса не держать блокировку записи SQLite.
+    """
+    entry = CachedDetection.query.filter_by(
+        page_hash=page_hash,
+        model_version=model_version,
+        conf_threshold=conf_threshold
+    ).first()
+
+    if entry is None:
+        result_cache_counters['misses'] += 1
+        return None
+
+    result_cache_counters['hits'] += 1
+    return entry
+
+
+def touch_cached_detections(entries):
+    """Отмечает использование записей кэша (для вытеснения давно не использованных)"""
+    now = datetime.utcnow()
+    for entry in entries:
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_used_at = now
+    record_stats(None, {('cache_hits', 'total', ''): len(entries)})
 
-    except Exception as e:
-        analysis.status = 'failed'
-        db.session.commit()
-        return jsonify({'error': str(e)}), 500
+
+def store_cached_detections(page_hash, model_version, conf_threshold, detected_errors):
+    """Сохраняет ошибки страницы в кэш и вытесняет давно не использованные записи"""
+    try:
+        # Параллельный запрос мог уже сохранить ту же страницу
+        with db.session.begin_nested():
+            db.session.add(CachedDetection(
+                page_hash=page_hash,
+                model_version=model_version,
+                conf_threshold=conf_threshold,
+                detections=json.dumps(detected_errors, ensure_ascii=False)
+            ))
+    except IntegrityError:
+        return
+
+    stale = []
+    overflow = CachedDetection.query.count() - config.RESULT_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale = db.session.query(CachedDetection.id, CachedDetection.hit_count) \
+            .order_by(CachedDetection.last_used_at.asc()) \
+            .limit(overflow).all()
+        CachedDetection.query.filter(CachedDetection.id.in_([entry_id for entry_id, _ in stale])) \
+            .delete(synchronize_session=False)
+    # Итоги кэша — по живым записям, вместе с вытесненными уходят и их попадания
+    record_stats(None, {
+        ('cache_entries', 'total', ''): 1 - len(stale),
+        ('cache_hits', 'total', ''): -sum(hits or 0 for _, hits in stale)
+    })
+
+
+def latest_completed_analysis(file_id):
+    """Последний завершённый анализ файла (поставленные в очередь ещё без результатов)"""
+    return AnalysisResult.query.filter_by(file_id=file_id, status='completed') \
+        .order_by(AnalysisResult.checked_at.desc()).first()
+
+
+def get_min_conf():
+    """Порог уверенности из параметра запроса ?min_conf= (по умолчанию config.DEFAULT_MIN_CONF)"""
+    min_conf = request.args.get('min_conf', type=float)
+    if min_conf is None:
+        return config.DEFAULT_MIN_CONF
+    return max(config.DETECTION_CONF_FLOOR, min(min_conf, 1.0))
+
+
+def filter_by_confidence(query, min_conf):
+    """Фильтр ошибок по уверенности (старые записи без confidence не отсекаются)"""
+    return query.filter(DetectedError.passes_confidence(min_conf))
+
+
+def filter_by_page(query, page_number):
+    """Фильтр ошибок по странице (у записей до постраничного режима страница — первая)"""
+    if page_number is None:
+        return query
+    return query.filter(db.func.coalesce(DetectedError.page_number, 1) == page_number)
+
+
+def count_by_severity(analysis_id, min_conf, page_number=None):
+    """Количество ошибок анализа по важности при заданном пороге (GROUP BY в SQL)"""
+    query = db.session.query(DetectedError.severity, db.func.count(DetectedError.id)) \
+        .filter(DetectedError.analysis_id == analysis_id)
+    query = filter_by_page(filter_by_confidence(query, min_conf), page_number)
+    rows = query.group_by(DetectedError.severity).all()
+
+    counts = {'critical': 0, 'high': 0, 'medium': 0, 'low': 0}
+    counts.update(dict(rows))
+    return counts
+
+
+def count_by_page(analysis_id, min_conf):
+    """Количество ошибок по страницам и важности одним GROUP BY"""
+    page = db.func.coalesce(DetectedError.page_number, 1)
+    query = db.session.query(page, DetectedError.severity, db.func.count(DetectedError.id)) \
+        .filter(DetectedError.analysis_id == analysis_id)
+    rows = filter_by_confidence(query, min_conf).group_by(page, DetectedError.severity).all()
+
+    counts = {}
+    for page_number, severity, count in rows:
+        counts.setdefault(page_number, {'critical': 0, 'high': 0, 'medium': 0, 'low': 0})[severity] = count
+    return counts
 
 
 def get_recommendation(error_type):
@@ -283,18 +1330,62 @@ def get_recommendation(error_type):
 def show_results(file_id):
     """Страница с визуализацией результатов"""
     file_entry = FileEntry.query.get_or_404(file_id)
-    analysis = AnalysisResult.query.filter_by(file_id=file_id) \
-        .order_by(AnalysisResult.checked_at.desc()).first()
+    analysis = latest_completed_analysis(file_id)
 
     if not analysis:
         return "Анализ не найден. Сначала запустите проверку.", 404
 
-    errors = DetectedError.query.filter_by(analysis_id=analysis.id).all()
+    pages = ensure_pages(file_entry)
+    db.session.commit()
+
+    page_number = request.args.get('page', 1, type=int)
+    page = next((p for p in pages if p.page_number == page_number), pages[0])
+
+    min_conf = get_min_conf()
+    errors = filter_by_page(
+        filter_by_confidence(DetectedError.query.filter_by(analysis_id=analysis.id), min_conf),
+        page.page_number
+    ).order_by(DetectedError.confidence.desc()).all()
 
     return render_template('results.html',
                            file=file_entry,
                            analysis=analysis,
-                           errors=errors)
+                           pages=pages,
+                           page=page,
+                           page_counts=count_by_page(analysis.id, min_conf),
+                           errors=errors,
+                           errors_json=[error.to_dict() for error in errors],
+                           min_conf=min_conf,
+                           severity_counts=count_by_severity(analysis.id, min_conf))
+
+
+@app.route('/results/<int:file_id>/annotated.png')
+def annotated_image(file_id):
+    """Размеченный чертёж по сохранённым ошибкам (без запуска модели)"""
+    file_entry = FileEntry.query.get_or_404(file_id)
+    analysis = latest_completed_analysis(file_id)
+
+    if not analysis:
+        return jsonify({'message': 'No analysis found for this file'}), 404
+
+    pages = ensure_pages(file_entry)
+    db.session.commit()
+
+    page_number = request.args.get('page', 1, type=int)
+    page = next((p for p in pages if p.page_number == page_number), None)
+    if page is None:
+        return jsonify({'message': 'Page not found'}), 404
+
+    errors = filter_by_page(
+        filter_by_confidence(DetectedError.query.filter_by(analysis_id=analysis.id), get_min_conf()),
+        page.page_number
+    ).all()
+    annotated = render_errors(page.filepath, [error.to_dict() for error in errors])
+
+    ok, png = cv2.imencode('.png', annotated)
+    if not ok:
+        return jsonify({'error': 'Rendering failed'}), 500
+    return Response(png.tobytes(), mimetype='image/png')
 
 
 # ========== JSON API ==========
@@ -303,29 +1394,44 @@ def get_results_json(file_id):
     """API: Получить результаты в JSON формате"""
     file_entry = FileEntry.query.get_or_404(file_id)
 
-    analysis = AnalysisResult.query.filter_by(file_id=file_id) \
-        .order_by(AnalysisResult.checked_at.desc()).first()
+    analysis = latest_completed_analysis(file_id)
 
     if not analysis:
         return jsonify({'message': 'No analysis found for this file'}), 404
 
-    errors = DetectedError.query.filter_by(analysis_id=analysis.id).all()
+    min_conf = get_min_conf()
+    page_number = request.args.get('page', type=int)
+    errors = filter_by_page(
+        filter_by_confidence(DetectedError.query.filter_by(analysis_id=analysis.id), min_conf),
+        page_number
+    ).order_by(DetectedError.page_number, DetectedError.confidence.desc()).all()
+    severity_counts = count_by_severity(analysis.id, min_conf, page_number)
+    page_counts = count_by_page(analysis.id, min_conf)
+
+    pages = []
+    for page in PageEntry.query.filter_by(file_id=file_id).order_by(PageEntry.page_number).all():
+        counts = page_counts.get(page.page_number, {'critical': 0, 'high': 0, 'medium': 0, 'low': 0})
+        pages.append(dict(page.to_dict(), total_errors=sum(counts.values()), errors_by_severity=counts))
 
     return jsonify({
         'file': {
             'id': file_entry.id,
             'filename': file_entry.filename,
-            'uploaded_at': file_entry.uploaded_at.isoformat()
+            'uploaded_at': file_entry.uploaded_at.isoformat(),
+            'page_count': file_entry.page_count
         },
+        'pages': pages,
         'analysis': {
             'id': analysis.id,
             'status': analysis.status,
             'checked_at': analysis.checked_at.isoformat(),
-            'total_errors': analysis.total_errors,
-            'critical_errors': analysis.critical_errors,
-            'high_errors': analysis.high_errors,
-            'medium_errors': analysis.medium_errors,
-            'low_errors': analysis.low_errors,
+            'min_conf': min_conf,
+            'page': page_number,
+            'total_errors': sum(severity_counts.values()),
+            'critical_errors': severity_counts['critical'],
+            'high_errors': severity_counts['high'],
+            'medium_errors': severity_counts['medium'],
+            'low_errors': severity_counts['low'],
             'processing_time': analysis.processing_time
         },
         'errors': [error.to_dict() for error in errors]
@@ -336,49 +1442,243 @@ def get_results_json(file_id):
 def mark_error_fixed(error_id):
     """Отметить ошибку как исправленную"""
     error = DetectedError.query.get_or_404(error_id)
-    error.is_fixed = True
-    error.fixed_at = datetime.utcnow()
-    db.session.commit()
+    if not error.is_fixed:
+        error.is_fixed = True
+        error.fixed_at = datetime.utcnow()
+        if error.passes_confidence(config.DEFAULT_MIN_CONF):
+            record_stats(error.fixed_at.date(), Counter(
+                error_stat_keys('fixed', error.error_type, error.error_category, error.severity)
+            ))
+        db.session.commit()
 
     return jsonify({'message': 'Error marked as fixed'}), 200
 
 
+@app.route('/health/ready')
+def readiness():
+    """Готовность к приёму запросов: модель загружена и прогрета"""
+    if config.INFERENCE_REPLICAS > 0:
+        ready = get_pool().is_ready()
+        models = get_pool().status()
+    else:
+        ready = registry.is_ready(config.MODEL_WEIGHTS)
+        models = registry.status()
+
+    return jsonify({
+        'ready': ready,
+        'models': models,
+        'batching': get_batcher().stats()
+    }), 200 if ready else 503
+
+
 @app.route('/statistics')
 def get_statistics():
-    """Общая статистика по всем проверкам"""
-    total_files = FileEntry.query.count()
-    total_analyses = AnalysisResult.query.count()
-    total_errors = DetectedError.query.count()
+    """
+    Общая статистика по всем проверкам (из материализованных счётчиков)
+
+    Тренд: ?bucket=day|week|month (по умолчанию day) и ?days= — за сколько
+    последних дней (по умолчанию config.STATS_TREND_DAYS).
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in STATS_BUCKETS:
+        return jsonify({'error': f'Unknown bucket: {bucket}'}), 400
+    days = max(1, min(request.args.get('days', config.STATS_TREND_DAYS, type=int), config.STATS_MAX_TREND_DAYS))
 
-    errors_by_category = db.session.query(
-        DetectedError.error_category,
-        db.func.count(DetectedError.id)
-    ).group_by(DetectedError.error_category).all()
+    totals = {}
+    for row in StatTotal.query.all():
+        totals.setdefault((row.metric, row.dimension), {})[row.key] = row.value
 
-    errors_by_severity = db.session.query(
-        DetectedError.severity,
-        db.func.count(DetectedError.id)
-    ).group_by(DetectedError.severity).all()
+    def total(metric):
+        return totals.get((metric, 'total'), {}).get('', 0)
+
+    lookups = result_cache_counters['hits'] + result_cache_counters['misses']
+    page_cache = get_page_cache()
 
     return jsonify({
-        'total_files': total_files,
-        'total_analyses': total_analyses,
-        'total_errors': total_errors,
-        'errors_by_category': dict(errors_by_category),
-        'errors_by_severity': dict(errors_by_severity)
+        'total_files': total('files'),
+        'total_analyses': total('analyses'),
+        'total_errors': total('errors'),
+        'fixed_errors': total('fixed'),
+        'errors_by_category': totals.get(('errors', 'category'), {}),
+        'errors_by_severity': totals.get(('errors', 'severity'), {}),
+        'errors_by_type': totals.get(('errors', 'type'), {}),
+        'trend': stats_trend(bucket, days),
+        'result_cache': {
+            'entries': total('cache_entries'),
+            'hits': result_cache_counters['hits'],
+            'misses': result_cache_counters['misses'],
+            'hit_rate': round(result_cache_counters['hits'] / lookups, 3) if lookups else 0,
+            'total_hits': total('cache_hits')
+        },
+        'page_cache': page_cache.stats() if page_cache else None
     }), 200
 
 
+STATS_BUCKETS = ('day', 'week', 'month')
+
+
+def stats_period(day, bucket):
+    """Начало периода тренда, в который попадает день, и подпись периода"""
+    if bucket == 'month':
+        return day.replace(day=1), day.strftime('%Y-%m')
+    if bucket == 'week':
+        day -= timedelta(days=day.weekday())
+    return day, day.isoformat()
+
+
+def error_stat_keys(metric, error_type, error_category, severity):
+    """Ключи счётчиков одной ошибки: итог и по каждому измерению"""
+    return [
+        (metric, 'total', ''),
+        (metric, 'category', error_category or ''),
+        (metric, 'severity', severity or ''),
+        (metric, 'type', error_type or '')
+    ]
+
+
+def record_stats(day, counts):
+    """
+    Прибавляет counts {(metric, dimension, key): delta} к итогам и к дню day
+    (day=None — только к итогам)
+
+    Выполняется в текущей транзакции, поэтому счётчики фиксируются вместе
+    с данными; UPSERT атомарен и при параллельных анализах.
+    """
+    counts = {key: delta for key, delta in counts.items() if delta}
+    if not counts:
+        return
+
+    targets = [(StatTotal, {})]
+    if day is not None:
+        targets.append((StatDaily, {'day': day}))
+    for model, extra in targets:
+        stmt = sqlite_insert(model).values([
+            {'metric': metric, 'dimension': dimension, 'key': key, 'value': delta, **extra}
+            for (metric, dimension, key), delta in counts.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[*extra, 'metric', 'dimension', 'key'],
+            set_={'value': model.value + stmt.excluded.value}
+        )
+        db.session.execute(stmt)
+
+
+def stats_trend(bucket, days):
+    """Файлы, анализы, ошибки (и по важности), исправления по периодам за последние days дней"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = StatDaily.query.filter(StatDaily.day >= since,
+                                  StatDaily.dimension.in_(('total', 'severity'))) \
+        .order_by(StatDaily.day).all()
+
+    periods = {}
+    for row in rows:
+        start, label = stats_period(row.day, bucket)
+        period = periods.setdefault(start, {
+            'period': label, 'files': 0, 'analyses': 0, 'errors': 0, 'fixed': 0,
+            'errors_by_severity': {}
+        })
+        if row.dimension == 'total':
+            period[row.metric] += row.value
+        elif row.metric == 'errors':
+            period['errors_by_severity'][row.key] = period['errors_by_severity'].get(row.key, 0) + row.value
+
+    return {
+        'bucket': bucket,
+        'since': since.isoformat(),
+        'series': [periods[start] for start in sorted(periods)]
+    }
+
+
+def compute_stats():
+    """Счётчики статистики, посчитанные заново по таблицам данных: {(day, metric, dimension, key): value}"""
+    counts = Counter()
+    day = db.func.date
+
+    for value, count in db.session.query(day(FileEntry.uploaded_at), db.func.count(FileEntry.id)) \
+            .group_by(day(FileEntry.uploaded_at)):
+        counts[(value, 'files', 'total', '')] += count
+
+    for value, count in db.session.query(day(AnalysisResult.checked_at), db.func.count(AnalysisResult.id)) \
+            .filter(AnalysisResult.status == 'completed').group_by(day(AnalysisResult.checked_at)):
+        counts[(value, 'analyses', 'total', '')] += count
+
+    dimensions = (DetectedError.error_type, DetectedError.error_category, DetectedError.severity)
+    errors = filter_by_confidence(
+        db.session.query(day(AnalysisResult.checked_at), *dimensions, db.func.count(DetectedError.id))
+        .join(AnalysisResult, AnalysisResult.id == DetectedError.analysis_id)
+        .filter(AnalysisResult.status == 'completed'),
+        config.DEFAULT_MIN_CONF
+    ).group_by(day(AnalysisResult.checked_at), *dimensions)
+    for value, error_type, error_category, severity, count in errors:
+        for key in error_stat_keys('errors', error_type, error_category, severity):
+            counts[(value, *key)] += count
+
+    fixed = filter_by_confidence(
+        db.session.query(day(DetectedError.fixed_at), *dimensions, db.func.count(DetectedError.id))
+        .filter(DetectedError.is_fixed.is_(True), DetectedError.fixed_at.isnot(None)),
+        config.DEFAULT_MIN_CONF
+    ).group_by(day(DetectedError.fixed_at), *dimensions)
+    for value, error_type, error_category, severity, count in fixed:
+        for key in error_stat_keys('fixed', error_type, error_category, severity):
+            counts[(value, *key)] += count
+
+    # Кэш результатов — только итоги, без дней
+    entries, hits = db.session.query(db.func.count(CachedDetection.id),
+                                     db.func.coalesce(db.func.sum(CachedDetection.hit_count), 0)).one()
+    counts[(None, 'cache_entries', 'total', '')] += entries
+    counts[(None, 'cache_hits', 'total', '')] += hits
+
+    return counts
+
+
+def rebuild_stats(check_only=False):
+    """
+    Пересчитывает материализованную статистику по таблицам данных
+
+    Returns:
+        расхождения сохранённых итогов с пересчитанными:
+        {(metric, dimension, key): (stored, actual)}
+    """
+    daily = compute_stats()
+    actual = Counter()
+    for (_, metric, dimension, key), value in daily.items():
+        actual[(metric, dimension, key)] += value
+
+    stored = {(row.metric, row.dimension, row.key): row.value for row in StatTotal.query.all()}
+    mismatches = {key: (stored.get(key, 0), actual.get(key, 0))
+                  for key in set(stored) | set(actual) if stored.get(key, 0) != actual.get(key, 0)}
+
+    if check_only:
+        db.session.rollback()
+        return mismatches
+
+    StatDaily.query.delete()
+    StatTotal.query.delete()
+    db.session.add_all(StatTotal(metric=metric, dimension=dimension, key=key, value=value)
+                       for (metric, dimension, key), value in actual.items())
+    db.session.add_all(StatDaily(day=datetime.strptime(day, '%Y-%m-%d').date(), metric=metric,
+                                 dimension=dimension, key=key, value=value)
+                       for (day, metric, dimension, key), value in daily.items() if day)
+    db.session.commit()
+    return mismatches
+
+
 @app.route('/files')
 def list_files():
-    """Список всех файлов с результатами анализа"""
-    files = FileEntry.query.order_by(FileEntry.uploaded_at.desc()).all()
+    """
+    Список файлов с последним анализом, страницами по config.FILES_PAGE_SIZE
 
-    result = []
-    for file in files:
-        latest_analysis = AnalysisResult.query.filter_by(file_id=file.id) \
-            .order_by(AnalysisResult.checked_at.desc()).first()
+    Параметры: ?limit=, ?status= (статус последнего анализа, none — не
+    проверялся), ?severity= (в последнем анализе есть ошибки этой
+    важности), ?cursor= (из заголовка X-Next-Cursor предыдущей страницы)
+    """
+    try:
+        files, next_cursor = files_with_latest_analysis(**get_file_filters())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    result = []
+    for file, latest_analysis, _ in files:
         result.append({
             'id': file.id,
             'filename': file.filename,
@@ -392,8 +1692,201 @@ def list_files():
             } if latest_analysis else None
         })
 
-    return jsonify(result), 200
+    response = jsonify(result)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_url = url_for('list_files', **{**request.args, 'cursor': next_cursor})
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response, 200
+
+
+SEVERITY_COLUMNS = {
+    'critical': AnalysisResult.critical_errors,
+    'high': AnalysisResult.high_errors,
+    'medium': AnalysisResult.medium_errors,
+    'low': AnalysisResult.low_errors
+}
+
+
+def get_file_filters():
+    """Параметры списка файлов из запроса (ValueError — некорректное значение)"""
+    severity = request.args.get('severity') or None
+    if severity is not None and severity not in SEVERITY_COLUMNS:
+        raise ValueError(f'Unknown severity: {severity}')
+
+    cursor = request.args.get('cursor') or None
+    return {
+        'cursor': decode_files_cursor(cursor) if cursor else None,
+        'limit': request.args.get('limit', type=int),
+        'status': request.args.get('status') or None,
+        'severity': severity
+    }
+
+
+def encode_files_cursor(file_entry):
+    return f'{file_entry.uploaded_at.isoformat()}_{file_entry.id}'
+
+
+def decode_files_cursor(cursor):
+    uploaded_at, _, file_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(uploaded_at), int(file_id)
+    except ValueError:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+def files_with_latest_analysis(cursor=None, limit=None, status=None, severity=None):
+    """
+    Страница файлов (новые первыми) с последним анализом каждого — одним запросом
+
+    Последний анализ ищется коррелированным подзапросом по индексу
+    (file_id, checked_at): на страницу приходится limit коротких поисков,
+    а не проход по всем анализам. Фильтры по статусу и важности — в том же
+    SQL. Пагинация по ключу (uploaded_at, id) без OFFSET: следующая
+    страница начинается сразу после последней строки предыдущей.
+
+    Returns:
+        (rows, next_cursor): rows — список (FileEntry, AnalysisResult или None,
+        id задачи анализа или None); next_cursor — None на последней странице
+    """
+    limit = max(1, min(limit or config.FILES_PAGE_SIZE, config.FILES_MAX_PAGE_SIZE))
+
+    latest_id = db.select(AnalysisResult.id) \
+        .where(AnalysisResult.file_id == FileEntry.id) \
+        .order_by(AnalysisResult.checked_at.desc(), AnalysisResult.id.desc()) \
+        .limit(1).correlate(FileEntry).scalar_subquery()
+
+    query = db.session.query(FileEntry, AnalysisResult, AnalysisJob.id) \
+        .outerjoin(AnalysisResult, AnalysisResult.id == latest_id) \
+        .outerjoin(AnalysisJob, AnalysisJob.analysis_id == AnalysisResult.id)
+
+    if status == 'none':
+        query = query.filter(AnalysisResult.id.is_(None))
+    elif status:
+        query = query.filter(AnalysisResult.status == status)
+    if severity:
+        query = query.filter(SEVERITY_COLUMNS[severity] > 0)
+    if cursor:
+        query = query.filter(db.tuple_(FileEntry.uploaded_at, FileEntry.id) < cursor)
+
+    rows = query.order_by(FileEntry.uploaded_at.desc(), FileEntry.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_files_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# ========== ОЧЕРЕДЬ АНАЛИЗОВ ==========
+
+job_queue = JobQueue(app, db, AnalysisJob, process_analysis_job, on_status=set_analysis_status,
+                     on_committed=publish_analysis_status, name='analysis-jobs')
+batch_queue = JobQueue(app, db, AnalysisBatch, process_analysis_batch, workers=config.BATCH_JOB_WORKERS,
+                       timeout=config.BATCH_JOB_TIMEOUT, on_status=set_batch_status, name='batch-jobs')
+
+
+@app.before_request
+def start_job_queue():
+    # Рабочие потоки запускаются в процессе, который обслуживает запросы
+    # (а не при импорте из flask-команд); задачи, оставшиеся in_progress
+    # после падения, они вернут в очередь по истечении аренды
+    start_inference()
+    job_queue.start()
+    batch_queue.start()
+
+
+# ========== ОБСЛУЖИВАНИЕ ==========
+
+def collect_garbage(dry_run=False, grace_seconds=None):
+    """
+    Удаляет из хранилища блобы, на которые не ссылается ни одна запись
+
+    Счётчики ссылок пересчитываются по FileEntry/PageEntry, так что
+    расхождения (например, после ручных правок БД) тоже исправляются.
+    Свежие блобы без записей не трогаем: их загрузка может быть ещё
+    не закоммичена. Заодно удаляются брошенные временные файлы загрузок
+    (.upload-*, .incoming-*) старше того же срока.
+    """
+    grace_seconds = config.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+
+    refs = Counter()
+    for (filepath,) in db.session.query(FileEntry.filepath):
+        refs[blob_store.key_for_path(filepath)] += 1
+    for filepath, display_filename in db.session.query(PageEntry.filepath, PageEntry.display_filename):
+        refs[blob_store.key_for_path(filepath)] += 1
+        if BlobStore.is_key(display_filename):
+            refs[display_filename] += 1
+
+    rows = {blob.key: blob for blob in StoredBlob.query.all()}
+    for key, blob in rows.items():
+        blob.ref_count = refs.get(key, 0)
+
+    stats = {'checked': 0, 'removed': 0, 'temp_removed': 0, 'freed_bytes': 0}
+    for key, _, mtime in list(blob_store.iter_keys()):
+        stats['checked'] += 1
+        if refs.get(key) or not blob_store.is_stale(mtime, grace_seconds):
+            continue
+        stats['removed'] += 1
+        if dry_run:
+            stats['freed_bytes'] += os.path.getsize(blob_store.path_for(key))
+            continue
+        stats['freed_bytes'] += blob_store.remove(key)
+        if key in rows:
+            db.session.delete(rows.pop(key))
+
+    for entry in os.scandir(UPLOAD_FOLDER):
+        if not entry.is_file() or not entry.name.startswith(('.upload-', '.incoming-')):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if not blob_store.is_stale(stat.st_mtime, grace_seconds):
+            continue
+        stats['temp_removed'] += 1
+        stats['freed_bytes'] += stat.st_size
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Строки блобов, файлов которых уже нет на диске
+    for key, blob in rows.items():
+        if not blob.ref_count and not os.path.exists(blob_store.path_for(key)) and not dry_run:
+            db.session.delete(blob)
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return stats
+
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Только показать, что будет удалено')
+def gc_uploads_command(dry_run):
+    """Сборка мусора в хранилище загрузок"""
+    stats = collect_garbage(dry_run=dry_run)
+    freed_mb = stats['freed_bytes'] / (1024 * 1024)
+    verb = 'Будет удалено' if dry_run else 'Удалено'
+    print(f"🧹 Проверено блобов: {stats['checked']}")
+    print(f"🗑️  {verb}: {stats['removed']} блобов, {stats['temp_removed']} временных файлов "
+          f"({freed_mb:.1f} МБ)")
+
+
+@app.cli.command('rebuild-stats')
+@click.option('--check', is_flag=True, help='Только сверить с данными, ничего не менять')
+def rebuild_stats_command(check):
+    """Пересчёт материализованной статистики (/statistics)"""
+    mismatches = rebuild_stats(check_only=check)
+    for (metric, dimension, key), (stored, actual) in sorted(mismatches.items()):
+        print(f"⚠️  {metric}/{dimension}/{key or '-'}: сохранено {stored}, по данным {actual}")
+    if not mismatches:
+        print("✅ Статистика совпадает с данными")
+    elif not check:
+        print(f"🔄 Статистика пересчитана, исправлено счётчиков: {len(mismatches)}")
 
 
 if __name__ == '__main__':
+    start_inference()
+    job_queue.start()
+    batch_queue.start()
     app.run(debug=True)
\ No newline at end of file
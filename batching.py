@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from inference_pool import get_pool
+from model_registry import registry
+
+
+class MicroBatcher:
+    """
+    Диспетчер микро-батчей для инференса.
+
+    Одиночные запросы (из потоков Flask или CLI) складываются в очередь,
+    а рабочий поток собирает их в батч, пока не наберётся max_batch_size
+    изображений или не истечёт max_latency_ms с момента первого запроса.
+    """
+
+    def __init__(self, run_batch, max_batch_size=None, max_latency_ms=None,
+                 workers=1, name='micro-batcher'):
+        """
+        Args:
+            run_batch: функция (images, conf_threshold) -> (список ошибок на изображение,
+                       версия весов, с которой шёл проход)
+            max_batch_size: максимальный размер батча
+            max_latency_ms: сколько ждать добора батча после первого запроса
+            workers: число потоков, параллельно отправляющих батчи
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size or config.BATCH_MAX_SIZE
+        self.max_latency = (max_latency_ms if max_latency_ms is not None
+                            else config.BATCH_MAX_LATENCY_MS) / 1000.0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'max_batch': 0}
+
+        self._threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._loop, name=f'{name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, image, conf_threshold=0.25):
+        """
+        Ставит изображение в очередь, возвращает Future со списком ошибок
+
+        У выполненного Future есть атрибуты inference_seconds — доля
+        времени батча, приходящаяся на это изображение, и model_version —
+        версия весов, которыми оно проверено (веса могут смениться
+        между постановкой в очередь и проходом модели).
+        """
+        if self._closed:
+            raise RuntimeError('MicroBatcher закрыт')
+        future = Future()
+        self._queue.put((image, conf_threshold, future))
+        return future
+
+    def detect(self, image, conf_threshold=0.25, timeout=None):
+        """Блокирующий вариант submit: ждёт результат своего изображения"""
+        return self.submit(image, conf_threshold).result(timeout=timeout)
+
+    def detect_many(self, images, conf_threshold=0.25, timeout=None):
+        """Отправляет сразу несколько изображений, возвращает результаты по порядку"""
+        futures = [self.submit(image, conf_threshold) for image in images]
+        return [f.result(timeout=timeout) for f in futures]
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_batch'] = round(stats['requests'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def close(self):
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Сигнал остановки вернём в очередь после обработки батча
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            self._run(batch)
+
+    def _run(self, batch):
+        # Порог уверенности — параметр прохода модели,
+        # поэтому запросы с разными порогами идут разными батчами
+        groups = {}
+        for image, conf_threshold, future in batch:
+            groups.setdefault(conf_threshold, []).append((image, future))
+
+        for conf_threshold, items in groups.items():
+            futures = [future for _, future in items]
+            start = time.monotonic()
+            try:
+                results, model_version = self.run_batch([image for image, _ in items], conf_threshold)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            per_image = (time.monotonic() - start) / len(items)
+            for future, errors in zip(futures, results):
+                future.inference_seconds = per_image
+                future.model_version = model_version
+                future.set_result(errors)
+
+            with self._stats_lock:
+                self._stats['requests'] += len(items)
+                self._stats['batches'] += 1
+                self._stats['max_batch'] = max(self._stats['max_batch'], len(items))
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    Общий батчер процесса
+
+    Батчи исполняются либо моделью из реестра в этом процессе, либо пулом
+    реплик (config.INFERENCE_REPLICAS > 0) — тогда батчей в полёте
+    столько же, сколько реплик.
+    """
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            if config.INFERENCE_REPLICAS > 0:
+                _batcher = MicroBatcher(get_pool().run_batch, workers=config.INFERENCE_REPLICAS)
+            else:
+                def run_batch(images, conf_threshold):
+                    detector, version = registry.get_with_version(config.MODEL_WEIGHTS)
+                    return detector.detect_errors_batch(
+                        images,
+                        conf_threshold=conf_threshold,
+                        batch_size=config.BATCH_MAX_SIZE
+                    ), version
+
+                _batcher = MicroBatcher(run_batch)
+        return _batcher
+
+
+def run_tiles(crops, conf_threshold, tile_size):
+    """
+    Пачка тайлов страницы на том же бэкенде, что и батчер: на репликах пула
+    (config.INFERENCE_REPLICAS > 0) или моделью из реестра в этом процессе
+
+    Тайлы не смешиваются с батчами целых страниц — у них свой вход модели.
+
+    Returns:
+        (массивы рамок (N, 6) по тайлам, версия весов)
+    """
+    if config.INFERENCE_REPLICAS > 0:
+        return get_pool().run_tiles(crops, conf_threshold, tile_size)
+    detector, version = registry.get_with_version(config.MODEL_WEIGHTS)
+    return detector.detect_tiles(crops, conf_threshold, imgsz=tile_size), version
@@ -0,0 +1,127 @@
+# benchmark_backends.py
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+import config
+from inference_backends import BACKENDS, resolve_weights
+
+
+def benchmark_backend(model_path, backend, images, data_yaml='data.yaml', runs=3):
+    """
+    Замер одного бэкенда: задержка на изображение и mAP на валидации
+
+    Returns:
+        dict: метрики бэкенда
+    """
+    print(f"\n⏱️  Бэкенд: {backend}")
+    weights = resolve_weights(model_path, backend)
+    model = YOLO(weights, task='detect')
+
+    # Прогрев, чтобы не мерить инициализацию сессии
+    model(images[0], imgsz=config.DETECTOR_IMGSZ, verbose=False)
+
+    latencies = []
+    detections = 0
+    for _ in range(runs):
+        for image in images:
+            start = time.perf_counter()
+            results = model(image, imgsz=config.DETECTOR_IMGSZ,
+                            conf=config.CONFIDENCE_THRESHOLD, verbose=False)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            detections += len(results.boxes)
+
+    print("📊 Валидация...")
+    metrics = model.val(data=data_yaml, imgsz=config.DETECTOR_IMGSZ,
+                        batch=1, device='cpu', plots=False, verbose=False)
+
+    latencies = np.array(latencies)
+    return {
+        'backend': backend,
+        'weights': weights,
+        'size_mb': round(_weights_size(weights) / 1024 / 1024, 2),
+        'latency_ms_mean': round(float(latencies.mean()), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+        'images_per_sec': round(1000 / float(latencies.mean()), 2),
+        'detections_per_image': round(detections / len(latencies), 2),
+        'map50': round(float(metrics.box.map50), 4),
+        'map50_95': round(float(metrics.box.map), 4)
+    }
+
+
+def compare_backends(model_path=None, backends=BACKENDS, images_folder=None,
+                     max_images=50, report_path='reports/backends_report.md'):
+    """Сравнивает бэкенды и пишет отчёт (Markdown + JSON)"""
+    model_path = model_path or config.MODEL_WEIGHTS
+    images_folder = images_folder or config.CALIBRATION_FOLDER
+
+    names = sorted(f for f in os.listdir(images_folder) if f.endswith('.png'))[:max_images]
+    if not names:
+        print(f"❌ Нет изображений в {images_folder}")
+        return None
+    images = [cv2.imread(os.path.join(images_folder, f)) for f in names]
+
+    rows = []
+    for backend in backends:
+        try:
+            rows.append(benchmark_backend(model_path, backend, images))
+        except Exception as e:
+            print(f"❌ {backend}: {str(e)}")
+            rows.append({'backend': backend, 'error': str(e)})
+
+    baseline = next((r for r in rows if r['backend'] == 'pytorch' and 'error' not in r), None)
+
+    lines = [
+        '# Сравнение бэкендов инференса',
+        '',
+        f'Модель: `{model_path}`, изображений: {len(images)}, imgsz: {config.DETECTOR_IMGSZ}',
+        '',
+        '| Бэкенд | Размер, МБ | Среднее, мс | p50, мс | p95, мс | изобр/с | Ускорение | mAP50 | mAP50-95 | ΔmAP50 |',
+        '|---|---|---|---|---|---|---|---|---|---|'
+    ]
+    for r in rows:
+        if 'error' in r:
+            lines.append(f"| {r['backend']} | ошибка: {r['error']} |||||||||")
+            continue
+        speedup = delta = '—'
+        if baseline:
+            speedup = f"{baseline['latency_ms_mean'] / r['latency_ms_mean']:.2f}x"
+            delta = f"{r['map50'] - baseline['map50']:+.4f}"
+        lines.append(
+            f"| {r['backend']} | {r['size_mb']} | {r['latency_ms_mean']} | {r['latency_ms_p50']} | "
+            f"{r['latency_ms_p95']} | {r['images_per_sec']} | {speedup} | {r['map50']} | "
+            f"{r['map50_95']} | {delta} |"
+        )
+
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    with open(os.path.splitext(report_path)[0] + '.json', 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+    print('\n' + '\n'.join(lines))
+    print(f"\n✅ Отчёт сохранён: {report_path}")
+    return rows
+
+
+def _weights_size(path):
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path) for f in files
+        )
+    return os.path.getsize(path)
+
+
+if __name__ == '__main__':
+    if not os.path.exists(config.MODEL_WEIGHTS):
+        print("❌ Модель не найдена!")
+        print("💡 Сначала обучите модель: python train_yolo.py")
+        exit(1)
+
+    compare_backends()
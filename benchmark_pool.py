@@ -0,0 +1,94 @@
+# benchmark_pool.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+from batching import MicroBatcher
+from inference_pool import InferencePool
+
+
+def benchmark_config(replicas, threads, images, pin_cores=False, clients=16):
+    """
+    Пропускная способность пула при заданных репликах и потоках
+
+    clients параллельных «запросов» отправляют изображения по одному,
+    как потоки Flask, через MicroBatcher поверх пула.
+    """
+    pool = InferencePool(replicas=replicas, threads_per_replica=threads, pin_cores=pin_cores)
+    while not pool.is_ready():
+        time.sleep(0.2)
+
+    batcher = MicroBatcher(pool.run_batch, workers=replicas, name='bench-batcher')
+    batcher.detect(images[0])  # прогрев конвейера
+
+    latencies = []
+
+    def one(image):
+        start = time.perf_counter()
+        batcher.detect(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(one, images))
+    elapsed = time.perf_counter() - start
+
+    stats = batcher.stats()
+    batcher.close()
+    pool.close()
+
+    latencies = np.array(latencies)
+    return {
+        'replicas': replicas,
+        'threads': threads,
+        'images_per_sec': round(len(images) / elapsed, 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 1),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 1),
+        'avg_batch': stats['avg_batch']
+    }
+
+
+def sweep(images_folder=None, max_images=64, pin_cores=False):
+    """Перебирает разбиения ядер на реплики x потоки и печатает лучшее"""
+    images_folder = images_folder or config.CALIBRATION_FOLDER
+    names = sorted(f for f in os.listdir(images_folder) if f.endswith('.png'))[:max_images]
+    if not names:
+        print(f"❌ Нет изображений в {images_folder}")
+        return None
+    images = [os.path.join(images_folder, f) for f in names]
+
+    cpu_count = os.cpu_count() or 1
+    configs = [
+        (replicas, cpu_count // replicas)
+        for replicas in range(1, cpu_count + 1)
+        if cpu_count % replicas == 0
+    ]
+
+    print(f"🖥️  Ядер: {cpu_count}, изображений: {len(images)}\n")
+    rows = []
+    for replicas, threads in configs:
+        row = benchmark_config(replicas, threads, images, pin_cores=pin_cores)
+        rows.append(row)
+        print(f"   реплик {replicas:2d} x потоков {threads:2d}: "
+              f"{row['images_per_sec']:7.2f} изобр/с, p50 {row['latency_ms_p50']} мс, "
+              f"p95 {row['latency_ms_p95']} мс, батч {row['avg_batch']}")
+
+    best = max(rows, key=lambda r: r['images_per_sec'])
+    print("\n" + "=" * 60)
+    print("💡 Рекомендуемые настройки config.py:")
+    print(f"   INFERENCE_REPLICAS = {best['replicas']}")
+    print(f"   INFERENCE_THREADS_PER_REPLICA = {best['threads']}")
+    print("=" * 60)
+    return rows
+
+
+if __name__ == '__main__':
+    if not os.path.exists(config.MODEL_WEIGHTS):
+        print("❌ Модель не найдена!")
+        print("💡 Сначала обучите модель: python train_yolo.py")
+        exit(1)
+
+    sweep(pin_cores=config.INFERENCE_PIN_CORES)
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+
+# Ключ блоба — sha256 содержимого и расширение исходного файла
+_KEY_RE = re.compile(r'^[0-9a-f]{64}(\.[0-9a-z]{1,8})?$')
+_EXT_RE = re.compile(r'^[0-9a-z]{1,8}$')
+
+
+class BlobStore:
+    """
+    Контентно-адресуемое хранилище загрузок
+
+    Файл хранится один раз под ключом <sha256><.ext> в каталоге,
+    разбитом по первым символам хэша (ab/cd/abcd….pdf), поэтому одинаковые
+    загрузки не дублируются, а разные файлы с одним именем не затирают
+    друг друга. Учёт ссылок ведётся в БД (StoredBlob в app.py).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(sha256, ext=''):
+        """
+        Ключ <sha256><.ext>; расширение берётся из имени файла пользователя,
+        поэтому всё, что не [0-9a-z]{1,8} (кириллица, '/', '..'), отбрасывается —
+        иначе ключ не прошёл бы is_key или вывел бы путь из хранилища
+        """
+        ext = (ext or '').lower().lstrip('.')
+        if not _EXT_RE.match(ext):
+            return sha256
+        return f'{sha256}.{ext}'
+
+    @staticmethod
+    def is_key(name):
+        return bool(name) and _KEY_RE.match(name) is not None
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def key_for_path(self, path):
+        """Ключ блоба по пути файла или None, если файл лежит вне хранилища"""
+        if not path:
+            return None
+        key = os.path.basename(path)
+        if self.is_key(key) and os.path.abspath(path) == os.path.abspath(self.path_for(key)):
+            return key
+        return None
+
+    def put_file(self, src_path, sha256, ext=''):
+        """
+        Переносит готовый файл в хранилище
+
+        Returns:
+            (key, path, created) — created=False, если такой блоб уже был
+            (тогда src_path просто удаляется)
+        """
+        key = self.make_key(sha256, ext)
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(src_path)
+            return key, path, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+        return key, path, True
+
+    def put_bytes(self, data, ext=''):
+        """
+        Сохраняет байты (например, PNG страницы)
+
+        Returns:
+            (key, path, sha256, created)
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        key = self.make_key(sha256, ext)
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return key, path, sha256, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return key, path, sha256, True
+
+    def iter_keys(self):
+        """Все блобы на диске: (key, path, mtime)"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if self.is_key(name):
+                    path = os.path.join(dirpath, name)
+                    yield name, path, os.path.getmtime(path)
+
+    def remove(self, key):
+        """Удаляет блоб, возвращает освобождённые байты"""
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+
+        # Пустые каталоги шардов тоже убираем
+        for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+        return size
+
+    def is_stale(self, mtime, grace_seconds):
+        """Блоб старше grace_seconds — его загрузка точно завершена или брошена"""
+        return time.time() - mtime > grace_seconds
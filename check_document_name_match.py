@@ -1,22 +1,108 @@
+import re
+
+# Код документа → наименование (ГОСТ 2.102, схемы — ГОСТ 2.701)
+CODE_TO_NAME = {
+    'СБ': 'сборочный чертёж',
+    'ВО': 'чертёж общего вида',
+    'ТЧ': 'теоретический чертёж',
+    'ГЧ': 'габаритный чертёж',
+    'МЭ': 'электромонтажный чертёж',
+    'МЧ': 'монтажный чертёж',
+    'УЧ': 'упаковочный чертёж',
+    'ВС': 'ведомость спецификаций',
+    'ВД': 'ведомость ссылочных документов',
+    'ВП': 'ведомость покупных изделий',
+    'ПЗ': 'пояснительная записка',
+    'ТУ': 'технические условия',
+    'ПМ': 'программа и методика испытаний',
+    'ТБ': 'таблица',
+    'РР': 'расчёт',
+    'Э0': 'схема электрическая объединённая',
+    'Э1': 'схема электрическая структурная',
+    'Э2': 'схема электрическая функциональная',
+    'Э3': 'схема электрическая принципиальная',
+    'Э4': 'схема электрическая соединений',
+    'Э5': 'схема электрическая подключения',
+    'Э6': 'схема электрическая общая',
+    'Э7': 'схема электрическая расположения',
+    'ПЭ3': 'перечень элементов',
+    # ... добавьте все из таблицы
+}
+
+# Латинские буквы, которые OCR путает с кириллицей (и ноль вместо «о»)
+_OCR_CONFUSIONS = str.maketrans({
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у', '0': 'о', 'ё': 'е',
+})
+_CODE_CONFUSIONS = str.maketrans({
+    'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'K': 'К', 'M': 'М',
+    'O': 'О', 'P': 'Р', 'T': 'Т', 'X': 'Х', 'Y': 'У', 'Ё': 'Е',
+})
+_SEPARATORS = re.compile(r'[\s\-‐‑‒–—_]+')
+# Перенос слова по слогам: «прин-\nципиальная»
+_HYPHEN_WRAP = re.compile(r'(?<=\w)[\-‐‑]\s+(?=\w)')
+
+
+def normalize_text(text):
+    """Регистр, ё→е, похожие латинские буквы, дефисы и пробелы — к единому виду"""
+    text = _HYPHEN_WRAP.sub('', text.casefold().translate(_OCR_CONFUSIONS))
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def normalize_code(code):
+    return _SEPARATORS.sub('', code.upper().translate(_CODE_CONFUSIONS))
+
+
+class DocumentNameMatcher:
+    """
+    Поиск всех наименований документов в тексте за один проход
+
+    Наименования нормализуются и собираются в одно регулярное выражение;
+    пробел между словами может потеряться при OCR, поэтому он необязателен.
+    Совпадения ищутся с перекрытием (lookahead), чтобы короткое
+    наименование внутри длинного тоже было найдено.
+    """
+
+    def __init__(self, code_to_name):
+        self.code_to_name = {normalize_code(code): name for code, name in code_to_name.items()}
+        self._keys = {code: self._key(normalize_text(name)) for code, name in self.code_to_name.items()}
+
+        names = sorted({normalize_text(name) for name in self.code_to_name.values()}, key=len, reverse=True)
+        alternation = '|'.join(' ?'.join(re.escape(word) for word in name.split(' ')) for name in names)
+        self._pattern = re.compile(f'(?=({alternation}))')
+
+    def find_names(self, normalized_text):
+        """Ключи наименований, встречающихся в нормализованном тексте"""
+        return {self._key(match.group(1)) for match in self._pattern.finditer(normalized_text)}
+
+    def expected_name(self, code):
+        return self.code_to_name.get(normalize_code(code), '')
+
+    def is_present(self, code, found_names):
+        key = self._keys.get(normalize_code(code))
+        return key is None or key in found_names
+
+    @staticmethod
+    def _key(name):
+        return name.replace(' ', '')
+
+
+_matcher = DocumentNameMatcher(CODE_TO_NAME)
+
+
 def check_document_name_match(self, text_results, found_codes):
     """Проверяет соответствие кода и наименования"""
-    # Словарь соответствий код → наименование
-    code_to_name = {
-        'СБ': 'сборочный чертёж',
-        'Э5': 'схема электрическая подключения',
-        'Э3': 'схема электрическая принципиальная',
-        # ... добавьте все из таблицы
-    }
+    # Текст документа собирается и нормализуется один раз,
+    # все наименования ищутся в нём одним проходом
+    full_text = ' '.join([r['text'].lower() for r in text_results])
+    found_names = _matcher.find_names(normalize_text(full_text))
 
     errors = []
     for code_info in found_codes:
         code = code_info['code']
-        expected_name = code_to_name.get(code, '').lower()
-
-        # Ищем наименование в тексте
-        full_text = ' '.join([r['text'].lower() for r in text_results])
+        expected_name = _matcher.expected_name(code).lower()
 
-        if expected_name and expected_name not in full_text:
+        if expected_name and not _matcher.is_present(code, found_names):
             errors.append({
                 'type': 'code_name_mismatch',
                 'code': code,
@@ -24,4 +110,4 @@ def check_document_name_match(self, text_results, found_codes):
                 'found_text': full_text[:100]
             })
 
-    return errors
\ No newline at end of file
+    return errors
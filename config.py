@@ -7,18 +7,133 @@ TEMP_FOLDER = os.path.join(BASE_DIR, 'temp')
 DATASET_FOLDER = os.path.join(BASE_DIR, 'dataset_errors')
 MODEL_WEIGHTS = os.path.join(BASE_DIR, 'models', 'best.pt')
 
+# Загрузка файлов: предельный размер и размер блока записи на диск
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Сборка мусора в хранилище загрузок (flask --app app gc-uploads) не трогает
+# блобы моложе этого срока — их загрузка может быть ещё не завершена
+BLOB_GC_GRACE_SECONDS = 3600
+
 # Параметры обработки
 PDF_DPI = 300
+# Дисковый кэш растеризованных страниц (.npy, читаются через mmap);
+# при превышении объёма вытесняются давно не читанные, 0 — кэш выключен
+PAGE_CACHE_FOLDER = os.path.join(BASE_DIR, 'cache', 'pages')
+PAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Каталог кэша общий для всех процессов сервера: раз в столько секунд
+# перед вытеснением каждый процесс пересчитывает его реальный объём
+PAGE_CACHE_RESCAN_SECONDS = 60
+CONVERT_WORKERS = os.cpu_count() or 1
 OCR_LANGUAGES = ['ru', 'en']
 OCR_GPU = False
+# Сколько EasyOCR Reader держать загруженными (= потоков, выполняющих OCR)
+OCR_WORKERS = 2
+# Сколько фрагментов распознаватель EasyOCR обрабатывает за один проход
+OCR_BATCH_SIZE = 16
+
+# Основная надпись (штамп): область страницы в долях (x0, y0, x1, y1)
+TITLE_BLOCK_REGION = (0.75, 0.75, 1.0, 1.0)
+# Текст штампа берётся из текстового слоя PDF (pdftotext); OCR запускается,
+# только если в области меньше TEXT_LAYER_MIN_CHARS символов (сканы)
+TEXT_LAYER_MIN_CHARS = 10
+TEXT_LAYER_TIMEOUT = 30
 
 # Параметры детектора
+DETECTOR_IMGSZ = 640
 CONFIDENCE_THRESHOLD = 0.5
+# Нижний порог, с которым запускается модель: в БД сохраняются все кандидаты,
+# а отображаемый порог (?min_conf=) применяется SQL-фильтром при запросе
+DETECTION_CONF_FLOOR = 0.05
+DEFAULT_MIN_CONF = 0.25
 NMS_THRESHOLD = 0.4
 
+# Микро-батчинг инференса: сколько изображений собирать в один проход
+# и сколько ждать добора батча после первого запроса
+BATCH_MAX_SIZE = 8
+BATCH_MAX_LATENCY_MS = 25
+
+# Пул реплик модели в отдельных процессах (0 — инференс в процессе сервера).
+# Реплик x потоков не должно быть больше числа ядер; подбор: python benchmark_pool.py
+INFERENCE_REPLICAS = 0
+INFERENCE_THREADS_PER_REPLICA = 2
+INFERENCE_PIN_CORES = False
+
+# Фоновая очередь анализов (таблица analysis_job в БД приложения).
+# 0 потоков — /analyze выполняется прямо в запросе, как раньше
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 3
+# Предел времени на один анализ, с; задержка повтора растёт как BACKOFF * 2^(n-1)
+JOB_TIMEOUT = 600
+JOB_RETRY_BACKOFF = 5
+JOB_POLL_INTERVAL = 1.0
+# Запас к JOB_TIMEOUT, после которого задача умершего процесса возвращается в очередь
+JOB_LEASE_GRACE = 60
+# Как часто index.html опрашивает /jobs/<id>, мс (если браузер без EventSource)
+JOB_STATUS_POLL_MS = 1500
+
+# SSE-поток хода анализа: очередь событий на подписчика, сколько последних
+# событий анализов помнить для поздних подписчиков, интервал keepalive, с
+PROGRESS_QUEUE_SIZE = 100
+PROGRESS_HISTORY_SIZE = 1000
+PROGRESS_KEEPALIVE = 15
+# Анализов в одном общем потоке /analyses/events (не больше страницы списка файлов)
+PROGRESS_MAX_STREAM_ANALYSES = 500
+
+# Пакетный анализ /analyze/batch: отдельная очередь (0 потоков — в запросе).
+# Одного потока достаточно: страницы всего набора и так идут в общие батчи.
+# Предел числа файлов и времени на набор, сколько медленных страниц в сводке
+BATCH_JOB_WORKERS = 1
+BATCH_MAX_FILES = 500
+BATCH_JOB_TIMEOUT = 3600
+BATCH_SLOWEST_PAGES = 10
+
+# Список файлов (/ и /files): размер страницы по умолчанию и предел ?limit=
+FILES_PAGE_SIZE = 50
+FILES_MAX_PAGE_SIZE = 500
+
+# Тренды /statistics: период по умолчанию и предел ?days=
+STATS_TREND_DAYS = 30
+STATS_MAX_TREND_DAYS = 366
+
+# Тайловый инференс для полноразмерных страниц (A1 при 300 DPI ~ 7000x10000):
+# мелкие объекты (*, стрелки допусков, знак шероховатости) не теряются при
+# сжатии страницы до входа модели
+TILED_INFERENCE = False
+TILE_SIZE = 1280
+TILE_OVERLAP = 0.2
+TILE_BATCH_SIZE = 8
+# Пачек тайлов одной страницы в работе одновременно: с пулом реплик
+# (INFERENCE_REPLICAS > 0) они идут на разные реплики параллельно, без
+# пула — по очереди через модель процесса (torch и так параллелит батч)
+TILE_WORKERS = 2
+TILE_MERGE_THRESHOLD = 0.5
+TILE_FULL_PASS = True
+
+# Растеризация PDF при загрузке:
+#   'inference' — сразу оттенки серого с длинной стороной под вход детектора
+#                 (с тайлами — полные PDF_DPI); полноразмерная копия для просмотра
+#                 рисуется только при первом открытии результатов
+#   'full'      — PDF_DPI в RGB, как раньше
+RASTER_MODE = 'inference'
+
+# Кэш результатов по sha256 страницы + версии модели + порогу (LRU по записям)
+RESULT_CACHE_MAX_ENTRIES = 10000
+
+# Бэкенд инференса: 'pytorch', 'onnx', 'onnx_int8' или 'openvino'
+# (сравнение скорости и mAP: python benchmark_backends.py)
+INFERENCE_BACKEND = 'pytorch'
+CALIBRATION_FOLDER = os.path.join(BASE_DIR, 'data', 'dataset', 'val', 'images')
+CALIBRATION_MAX_IMAGES = 200
+
 # Пути к системным утилитам (для macOS)
 POPPLER_PATH = '/opt/homebrew/bin'
 TESSERACT_CMD = '/opt/homebrew/bin/tesseract'
+TESSERACT_LANG = 'rus'
+# Параллельных процессов tesseract при анализе многостраничных документов
+TESSERACT_WORKERS = os.cpu_count() or 1
+# Потоков OpenMP у каждого процесса tesseract: страницы уже параллелятся
+# процессами, а общий лимит в окружении приложения зацепил бы и torch
+TESSERACT_THREAD_LIMIT = 1
 
 # Создание папок
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
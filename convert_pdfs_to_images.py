@@ -1,141 +1,282 @@
+import json
 import os
-from pdf2image import convert_from_path
-from pathlib import Path
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
+import config
+from pdf_pages import iter_pages, save_png
 
-def convert_pdfs_to_images_recursive(root_folder, output_folder, dpi=300, poppler_path=None):
-    """Рекурсивная конвертация всех PDF в папке и подпапках в PNG"""
-    os.makedirs(output_folder, exist_ok=True)
+MANIFEST_NAME = '.conversion_manifest.json'
 
-    # Проверяем существование папки
-    if not os.path.exists(root_folder):
-        print(f"❌ Папка не найдена: {root_folder}")
-        return
 
-    # Ищем все PDF файлы рекурсивно
+def find_pdfs(root_folder):
+    """Рекурсивный поиск PDF файлов"""
     pdf_files = []
     for root, dirs, files in os.walk(root_folder):
         for file in files:
             if file.endswith('.pdf'):
                 pdf_files.append(os.path.join(root, file))
+    return sorted(pdf_files)
+
+
+def convert_pdf_jobs(jobs, output_folder, dpi=300, poppler_path=None, workers=None,
+                     retries=2, manifest_path=None, first_index=1, grayscale=False, scale_to=None):
+    """
+    Параллельная конвертация с манифестом
+
+    Каждый PDF конвертируется в отдельном процессе (постранично, без
+    загрузки всего документа в память). Манифест хранит для каждого PDF
+    mtime, размер, число страниц и sha256 выходных PNG: при повторном
+    запуске уже сконвертированные файлы пропускаются. Во время работы
+    итоги дописываются строками в журнал рядом с манифестом, а сам
+    манифест переписывается один раз в конце — прерванный запуск
+    восстанавливается из журнала. Если процесс пула убит (например, OOM
+    poppler на большом листе), пул пересоздаётся, а задачи, которые
+    в нём были, повторяются как упавшие.
+
+    Args:
+        jobs: список (pdf_path, output_dir, output_stem, label)
+        output_folder: корневая папка результатов (там же манифест)
+        workers: число процессов (по умолчанию config.CONVERT_WORKERS)
+        retries: сколько раз повторять упавшую конвертацию
+        first_index: номер первой страницы в имени файла (1 или 0)
+        grayscale: растеризовать сразу в оттенках серого
+        scale_to: длинная сторона страницы в пикселях вместо dpi
+                  (например pdf_pages.inference_long_side(); None — по dpi)
+
+    Returns:
+        dict: итоговая статистика
+    """
+    workers = workers or config.CONVERT_WORKERS
+    manifest_path = manifest_path or os.path.join(output_folder, MANIFEST_NAME)
+    journal_path = _journal_path(manifest_path)
+    manifest = _load_manifest(manifest_path)
+    raster = {'dpi': dpi, 'grayscale': grayscale, 'scale_to': scale_to}
+
+    todo = []
+    skipped = 0
+    for job in jobs:
+        if _is_converted(manifest.get(os.path.abspath(job[0])), raster):
+            skipped += 1
+        else:
+            todo.append(job)
 
-    if not pdf_files:
-        print(f"⚠️ В папке {root_folder} не найдено PDF файлов")
-        return
+    print(f"📁 Найдено {len(jobs)} PDF файлов, уже сконвертировано: {skipped}")
+    print(f"📂 Результаты будут сохранены в: {output_folder}")
+    print(f"⚙️  Процессов: {workers}\n")
 
-    print(f"📁 Найдено {len(pdf_files)} PDF файлов в {root_folder}")
-    print(f"📂 Результаты будут сохранены в: {output_folder}\n")
+    stats = {'successful': 0, 'failed': 0, 'skipped': skipped, 'pages': 0}
+    attempts = {job[0]: 0 for job in todo}
+    start = time.time()
+    done = 0
 
-    total_pages = 0
-    successful_files = 0
-    failed_files = 0
-
-    for idx, pdf_path in enumerate(pdf_files, 1):
-        # Получаем относительный путь для сохранения структуры папок
-        rel_path = os.path.relpath(pdf_path, root_folder)
-        rel_dir = os.path.dirname(rel_path)
-        filename = os.path.basename(pdf_path)
-
-        # Создаем подпапку в выходной директории
-        if rel_dir:
-            output_subfolder = os.path.join(output_folder, rel_dir)
-            os.makedirs(output_subfolder, exist_ok=True)
-        else:
-            output_subfolder = output_folder
-
-        print(f"[{idx}/{len(pdf_files)}] 📄 {rel_path}")
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+    broken = []  # задачи, ждущие нового пула после гибели процесса
 
+    def submit(job):
         try:
-            # Конвертация с учетом poppler_path для macOS
-            if poppler_path:
-                pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=poppler_path)
-            else:
-                pages = convert_from_path(pdf_path, dpi=dpi)
-
-            for i, page in enumerate(pages):
-                output_filename = f"{filename[:-4]}_page_{i + 1}.png"
-                output_path = os.path.join(output_subfolder, output_filename)
-                page.save(output_path, 'PNG')
-                print(f"  ✅ Страница {i + 1}/{len(pages)} → {output_filename}")
-
-            total_pages += len(pages)
-            successful_files += 1
-            print(f"  ✓ Готово: {len(pages)} страниц\n")
-
-        except Exception as e:
-            failed_files += 1
-            print(f"  ❌ Ошибка: {str(e)}\n")
+            pending[executor.submit(_convert_one, job, raster, poppler_path, first_index)] = job
+        except BrokenProcessPool:
+            broken.append(job)
+
+    def record_result(pdf_path, record):
+        manifest[os.path.abspath(pdf_path)] = record
+        journal.write(json.dumps({'source': os.path.abspath(pdf_path), 'record': record},
+                                 ensure_ascii=False) + '\n')
+        journal.flush()
+
+    journal = open(journal_path, 'a', encoding='utf-8')
+    try:
+        for job in todo:
+            submit(job)
+
+        while pending or broken:
+            for future in as_completed(list(pending)):
+                job = pending.pop(future)
+                pdf_path, _, _, label = job
+                attempts[pdf_path] += 1
+
+                try:
+                    record = future.result()
+                except Exception as e:
+                    if attempts[pdf_path] <= retries:
+                        print(f"  🔁 Повтор {attempts[pdf_path]}/{retries}: {label} ({type(e).__name__}: {e})")
+                        if isinstance(e, BrokenProcessPool):
+                            broken.append(job)
+                        else:
+                            submit(job)
+                        continue
+
+                    done += 1
+                    stats['failed'] += 1
+                    record_result(pdf_path, {'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+                    print(f"[{done}/{len(todo)}] ❌ {label}: {str(e)}")
+                    continue
+
+                done += 1
+                stats['successful'] += 1
+                stats['pages'] += record['pages']
+                record_result(pdf_path, record)
+
+                elapsed = time.time() - start
+                print(f"[{done}/{len(todo)}] ✅ {label}: {record['pages']} стр. "
+                      f"({stats['pages'] / elapsed:.2f} стр/с)")
+
+            if broken:
+                # Пул с погибшим процессом больше не принимает задачи
+                print(f"  ⚠️  Процесс пула завершился аварийно, новый пул для {len(broken)} задач")
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                retry_jobs, broken[:] = list(broken), []
+                for job in retry_jobs:
+                    submit(job)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        journal.close()
+        # Журнал сворачивается в манифест (и при прерывании — что успели)
+        _save_manifest(manifest_path, manifest)
+        os.remove(journal_path)
+
+    elapsed = time.time() - start
+    stats['elapsed'] = round(elapsed, 2)
+    stats['pages_per_sec'] = round(stats['pages'] / elapsed, 2) if elapsed > 0 else 0
 
     print("=" * 60)
     print(f"🎉 Конвертация завершена!")
-    print(f"   ✅ Успешно обработано: {successful_files} файлов")
-    print(f"   ❌ Ошибок: {failed_files} файлов")
-    print(f"   📄 Всего страниц: {total_pages}")
+    print(f"   ✅ Успешно обработано: {stats['successful']} файлов")
+    print(f"   ⏭️  Пропущено (уже готово): {stats['skipped']} файлов")
+    print(f"   ❌ Ошибок: {stats['failed']} файлов")
+    print(f"   📄 Всего страниц: {stats['pages']}")
+    print(f"   ⚡ Скорость: {stats['pages_per_sec']} стр/с за {stats['elapsed']} с")
     print(f"   📂 Результаты в: {output_folder}")
     print("=" * 60)
-
-
-def convert_pdfs_flat(root_folder, output_folder, dpi=300, poppler_path=None):
-    """Конвертация всех PDF в одну плоскую папку (без сохранения структуры)"""
+    return stats
+
+
+def _convert_one(job, raster, poppler_path, first_index):
+    """Конвертация одного PDF (выполняется в процессе пула)"""
+    pdf_path, output_dir, output_stem, _ = job
+    os.makedirs(output_dir, exist_ok=True)
+    stat = os.stat(pdf_path)
+
+    outputs = []
+    for page_number, page in iter_pages(pdf_path, dpi=raster['dpi'], poppler_path=poppler_path,
+                                        grayscale=raster['grayscale'], scale_to=raster['scale_to']):
+        output_path = os.path.join(output_dir, f"{output_stem}_page_{page_number - 1 + first_index}.png")
+        _, sha256 = save_png(page, output_path)
+        page.close()
+        outputs.append({'path': output_path, 'sha256': sha256})
+
+    return {
+        'status': 'done',
+        'source': pdf_path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'pages': len(outputs),
+        'raster': raster,
+        'outputs': outputs
+    }
+
+
+def _is_converted(record, raster):
+    if not record or record.get('status') != 'done':
+        return False
+    # Старые записи манифеста — полноцветные страницы без масштабирования
+    if record.get('raster', {'dpi': raster['dpi'], 'grayscale': False, 'scale_to': None}) != raster:
+        return False
+    try:
+        stat = os.stat(record['source'])
+    except OSError:
+        return False
+    if stat.st_mtime != record['mtime'] or stat.st_size != record['size']:
+        return False
+    return all(os.path.exists(out['path']) for out in record['outputs'])
+
+
+def _journal_path(manifest_path):
+    return os.path.splitext(manifest_path)[0] + '.jsonl'
+
+
+def _load_manifest(path):
+    manifest = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    # Итоги прерванного запуска, не успевшие попасть в манифест
+    journal_path = _journal_path(path)
+    if os.path.exists(journal_path):
+        with open(journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # строка, оборванная на записи
+                manifest[entry['source']] = entry['record']
+    return manifest
+
+
+def _save_manifest(path, manifest):
+    # Запись через временный файл: прерванный запуск не портит манифест
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def convert_pdfs_to_images_recursive(root_folder, output_folder, dpi=300, poppler_path=None,
+                                     workers=None, retries=2, grayscale=False, scale_to=None):
+    """Рекурсивная конвертация всех PDF в папке и подпапках в PNG"""
     os.makedirs(output_folder, exist_ok=True)
 
+    # Проверяем существование папки
     if not os.path.exists(root_folder):
         print(f"❌ Папка не найдена: {root_folder}")
         return
 
-    # Ищем все PDF файлы рекурсивно
-    pdf_files = []
-    for root, dirs, files in os.walk(root_folder):
-        for file in files:
-            if file.endswith('.pdf'):
-                pdf_files.append(os.path.join(root, file))
-
+    pdf_files = find_pdfs(root_folder)
     if not pdf_files:
         print(f"⚠️ В папке {root_folder} не найдено PDF файлов")
         return
 
-    print(f"📁 Найдено {len(pdf_files)} PDF файлов")
-    print(f"📂 Результаты будут сохранены в: {output_folder}\n")
+    jobs = []
+    for pdf_path in pdf_files:
+        # Сохраняем структуру папок
+        rel_path = os.path.relpath(pdf_path, root_folder)
+        rel_dir = os.path.dirname(rel_path)
+        filename = os.path.basename(pdf_path)
+        output_subfolder = os.path.join(output_folder, rel_dir) if rel_dir else output_folder
+        jobs.append((pdf_path, output_subfolder, filename[:-4], rel_path))
 
-    total_pages = 0
-    successful_files = 0
-    failed_files = 0
+    return convert_pdf_jobs(jobs, output_folder, dpi=dpi, poppler_path=poppler_path,
+                            workers=workers, retries=retries, grayscale=grayscale, scale_to=scale_to)
 
-    for idx, pdf_path in enumerate(pdf_files, 1):
-        filename = os.path.basename(pdf_path)
-        rel_path = os.path.relpath(pdf_path, root_folder)
 
-        print(f"[{idx}/{len(pdf_files)}] 📄 {rel_path}")
+def convert_pdfs_flat(root_folder, output_folder, dpi=300, poppler_path=None,
+                      workers=None, retries=2, grayscale=False, scale_to=None):
+    """Конвертация всех PDF в одну плоскую папку (без сохранения структуры)"""
+    os.makedirs(output_folder, exist_ok=True)
 
-        try:
-            if poppler_path:
-                pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=poppler_path)
-            else:
-                pages = convert_from_path(pdf_path, dpi=dpi)
-
-            for i, page in enumerate(pages):
-                # Используем полный путь в имени файла для уникальности
-                safe_name = rel_path.replace('/', '_').replace('\\', '_')
-                output_filename = f"{safe_name[:-4]}_page_{i + 1}.png"
-                output_path = os.path.join(output_folder, output_filename)
-                page.save(output_path, 'PNG')
-                print(f"  ✅ Страница {i + 1}/{len(pages)} → {output_filename}")
-
-            total_pages += len(pages)
-            successful_files += 1
-            print(f"  ✓ Готово: {len(pages)} страниц\n")
-
-        except Exception as e:
-            failed_files += 1
-            print(f"  ❌ Ошибка: {str(e)}\n")
+    if not os.path.exists(root_folder):
+        print(f"❌ Папка не найдена: {root_folder}")
+        return
 
-    print("=" * 60)
-    print(f"🎉 Конвертация завершена!")
-    print(f"   ✅ Успешно обработано: {successful_files} файлов")
-    print(f"   ❌ Ошибок: {failed_files} файлов")
-    print(f"   📄 Всего страниц: {total_pages}")
-    print(f"   📂 Результаты в: {output_folder}")
-    print("=" * 60)
+    pdf_files = find_pdfs(root_folder)
+    if not pdf_files:
+        print(f"⚠️ В папке {root_folder} не найдено PDF файлов")
+        return
+
+    jobs = []
+    for pdf_path in pdf_files:
+        rel_path = os.path.relpath(pdf_path, root_folder)
+        # Используем полный путь в имени файла для уникальности
+        safe_name = rel_path.replace('/', '_').replace('\\', '_')
+        jobs.append((pdf_path, output_folder, safe_name[:-4], rel_path))
+
+    return convert_pdf_jobs(jobs, output_folder, dpi=dpi, poppler_path=poppler_path,
+                            workers=workers, retries=retries, grayscale=grayscale, scale_to=scale_to)
 
 
 if __name__ == '__main__':
@@ -143,6 +284,7 @@ if __name__ == '__main__':
     PDF_FOLDER = '/Users/georgewashington/Downloads/Для отправки_02102025'
     OUTPUT_FOLDER = './converted_images'
     DPI = 300
+    WORKERS = os.cpu_count()
 
     # Для macOS с Homebrew Poppler
     POPPLER_PATH = '/opt/homebrew/bin'
@@ -155,7 +297,8 @@ if __name__ == '__main__':
     #     root_folder=PDF_FOLDER,
     #     output_folder=OUTPUT_FOLDER,
     #     dpi=DPI,
-    #     poppler_path=POPPLER_PATH
+    #     poppler_path=POPPLER_PATH,
+    #     workers=WORKERS
     # )
 
     # Вариант 2: Все файлы в одну папку (раскомментируйте если нужно)
@@ -164,5 +307,6 @@ if __name__ == '__main__':
         root_folder=PDF_FOLDER,
         output_folder=OUTPUT_FOLDER,
         dpi=DPI,
-        poppler_path=POPPLER_PATH
-    )
\ No newline at end of file
+        poppler_path=POPPLER_PATH,
+        workers=WORKERS
+    )
@@ -0,0 +1,183 @@
+import os
+import re
+
+import cv2
+import numpy as np
+
+import config
+
+# Поддерживаемые бэкенды инференса:
+#   pytorch   — исходная модель ultralytics (models/best.pt)
+#   onnx      — экспорт в ONNX, исполняется через ONNX Runtime
+#   onnx_int8 — статически квантованная INT8-модель ONNX Runtime
+#   openvino  — экспорт в OpenVINO IR
+BACKENDS = ('pytorch', 'onnx', 'onnx_int8', 'openvino')
+
+
+def resolve_weights(model_path, backend=None):
+    """
+    Возвращает путь к весам для выбранного бэкенда, при необходимости
+    экспортируя их из .pt. Экспорт повторяется, только если .pt новее.
+
+    Все бэкенды загружаются через YOLO(...), поэтому формат
+    результатов detect_errors у них одинаковый.
+    """
+    backend = backend or config.INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"❌ Неизвестный бэкенд: {backend} (доступны: {', '.join(BACKENDS)})")
+
+    if backend == 'pytorch':
+        return model_path
+    if backend == 'onnx':
+        return export_onnx(model_path)
+    if backend == 'onnx_int8':
+        return quantize_onnx_int8(export_onnx(model_path))
+    return export_openvino(model_path)
+
+
+def export_onnx(model_path, imgsz=None):
+    """Экспорт .pt → .onnx с динамическим батчем (для detect_errors_batch)"""
+    onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    if _is_fresh(onnx_path, model_path):
+        return onnx_path
+
+    from ultralytics import YOLO
+
+    print(f"📦 Экспорт в ONNX: {model_path}")
+    exported = YOLO(model_path).export(
+        format='onnx',
+        imgsz=imgsz or config.DETECTOR_IMGSZ,
+        dynamic=True,
+        simplify=True
+    )
+    return str(exported)
+
+
+def export_openvino(model_path, imgsz=None):
+    """Экспорт .pt → OpenVINO IR (папка <name>_openvino_model)"""
+    ov_dir = os.path.splitext(model_path)[0] + '_openvino_model'
+    if _is_fresh(ov_dir, model_path):
+        return ov_dir
+
+    from ultralytics import YOLO
+
+    print(f"📦 Экспорт в OpenVINO: {model_path}")
+    exported = YOLO(model_path).export(
+        format='openvino',
+        imgsz=imgsz or config.DETECTOR_IMGSZ,
+        half=False
+    )
+    return str(exported)
+
+
+def quantize_onnx_int8(onnx_path, calibration_folder=None, max_images=None):
+    """
+    Статическая INT8-квантизация ONNX-модели
+
+    Активации калибруются на изображениях валидационной выборки
+    (config.CALIBRATION_FOLDER). Голова детектора остаётся в FP32:
+    квантование координат рамок заметно роняет mAP.
+    """
+    int8_path = os.path.splitext(onnx_path)[0] + '_int8.onnx'
+    if _is_fresh(int8_path, onnx_path):
+        return int8_path
+
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    calibration_folder = calibration_folder or config.CALIBRATION_FOLDER
+    max_images = max_images or config.CALIBRATION_MAX_IMAGES
+
+    print(f"🧮 INT8-квантизация: {onnx_path}")
+    print(f"   Калибровка на: {calibration_folder}")
+
+    prep_path = os.path.splitext(onnx_path)[0] + '_prep.onnx'
+    quant_pre_process(onnx_path, prep_path)
+
+    model = onnx.load(prep_path)
+    input_name = model.graph.input[0].name
+    reader = _CalibrationReader(calibration_folder, input_name, max_images)
+
+    quantize_static(
+        prep_path,
+        int8_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        nodes_to_exclude=_head_nodes(model)
+    )
+    os.remove(prep_path)
+
+    # ultralytics берёт имена классов и параметры из метаданных модели
+    source = onnx.load(onnx_path)
+    quantized = onnx.load(int8_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, int8_path)
+
+    print(f"✅ INT8-модель: {int8_path}")
+    return int8_path
+
+
+def letterbox(image, imgsz):
+    """Вписывает изображение в квадрат imgsz x imgsz с серыми полями, как ultralytics"""
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+
+def _head_nodes(model):
+    """Узлы последнего модуля YOLOv8 (Detect) — их оставляем в FP32"""
+    indices = [
+        int(m.group(1))
+        for node in model.graph.node
+        for m in [re.match(r'/model\.(\d+)/', node.name)] if m
+    ]
+    if not indices:
+        return []
+    head = f'/model.{max(indices)}/'
+    return [node.name for node in model.graph.node if node.name.startswith(head)]
+
+
+def _is_fresh(target, source):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+
+class _CalibrationReader:
+    """
+    Поставщик калибровочных примеров для quantize_static
+
+    Реализует интерфейс onnxruntime CalibrationDataReader (get_next/rewind)
+    без импорта onnxruntime на уровне модуля — это опциональная зависимость.
+    """
+
+    def __init__(self, folder, input_name, max_images):
+        images = sorted(f for f in os.listdir(folder) if f.endswith('.png'))[:max_images]
+        if not images:
+            raise FileNotFoundError(f"❌ Нет изображений для калибровки в {folder}")
+        self.paths = [os.path.join(folder, f) for f in images]
+        self.input_name = input_name
+        self._iter = iter(self.paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+
+        image = cv2.imread(path)
+        blob = letterbox(image, config.DETECTOR_IMGSZ)[:, :, ::-1]  # BGR → RGB
+        blob = np.ascontiguousarray(blob.transpose(2, 0, 1), dtype=np.float32) / 255.0
+        return {self.input_name: blob[None]}
+
+    def rewind(self):
+        self._iter = iter(self.paths)
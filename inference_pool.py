@@ -0,0 +1,209 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import config
+
+
+class InferencePool:
+    """
+    Пул реплик модели в отдельных процессах
+
+    Каждая реплика — свой GOSTErrorDetector с фиксированным числом потоков
+    torch (и, по желанию, привязкой к ядрам), задачи раздаются через общую
+    очередь. Так параллельные запросы не дерутся за ядра, как это бывает
+    при одной модели с потоками torch по умолчанию.
+    """
+
+    def __init__(self, replicas=None, threads_per_replica=None, pin_cores=None, model_path=None):
+        self.replicas = replicas or config.INFERENCE_REPLICAS
+        self.threads_per_replica = threads_per_replica or config.INFERENCE_THREADS_PER_REPLICA
+        self.pin_cores = config.INFERENCE_PIN_CORES if pin_cores is None else pin_cores
+        self.model_path = model_path or config.MODEL_WEIGHTS
+
+        self._ctx = mp.get_context('spawn')
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+
+        self._futures = {}
+        self._in_flight = {}  # номер реплики → id задачи, которую она выполняет
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._processes = [self._spawn(i) for i in range(self.replicas)]
+        self._ready = set()
+
+        self._collector = threading.Thread(target=self._collect, name='inference-pool', daemon=True)
+        self._collector.start()
+
+    def submit(self, images, conf_threshold=0.25, tile_size=None):
+        """
+        Отправляет батч изображений (пути или numpy-массивы) любой свободной реплике
+
+        С tile_size батч — тайлы страницы: реплика прогоняет их с входом
+        модели tile_size и возвращает сырые рамки (GOSTErrorDetector.detect_tiles)
+        """
+        if self._closed:
+            raise RuntimeError('InferencePool закрыт')
+        future = Future()
+        with self._lock:
+            task_id = next(self._ids)
+            self._futures[task_id] = future
+        self._tasks.put((task_id, list(images), conf_threshold, tile_size))
+        return future
+
+    def run_batch(self, images, conf_threshold=0.25):
+        """
+        Блокирующий вариант submit — подходит как run_batch для MicroBatcher
+
+        Returns:
+            (ошибки по изображениям, версия весов, с которой работала реплика)
+        """
+        return self.submit(images, conf_threshold).result()
+
+    def run_tiles(self, crops, conf_threshold, tile_size):
+        """
+        Пачка тайлов на реплике (блокирующе)
+
+        Returns:
+            (массивы рамок по тайлам, версия весов)
+        """
+        return self.submit(crops, conf_threshold, tile_size).result()
+
+    def is_ready(self):
+        return len(self._ready) == self.replicas
+
+    def status(self):
+        return {
+            'replicas': self.replicas,
+            'threads_per_replica': self.threads_per_replica,
+            'pin_cores': self.pin_cores,
+            'ready': sorted(self._ready),
+            'alive': [p.is_alive() for p in self._processes],
+            'in_flight': len(self._futures)
+        }
+
+    def close(self):
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+        self._results.put(None)
+        self._collector.join(timeout=10)
+
+    def _cores_for(self, index):
+        if not self.pin_cores:
+            return None
+        cpu_count = os.cpu_count() or 1
+        first = index * self.threads_per_replica
+        return sorted({(first + i) % cpu_count for i in range(self.threads_per_replica)})
+
+    def _spawn(self, index):
+        process = self._ctx.Process(
+            target=_replica_main,
+            args=(index, self.model_path, self.threads_per_replica, self._cores_for(index),
+                  self._tasks, self._results),
+            name=f'inference-replica-{index}',
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_replicas()
+                continue
+            if message is None:
+                return
+
+            kind, index, task_id, payload = message
+            if kind == 'ready':
+                self._ready.add(index)
+            elif kind == 'taken':
+                self._in_flight[index] = task_id
+            else:
+                self._in_flight.pop(index, None)
+                with self._lock:
+                    future = self._futures.pop(task_id, None)
+                if future is None:
+                    continue
+                if kind == 'done':
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload))
+
+    def _check_replicas(self):
+        """Перезапускает упавшие реплики; их текущая задача завершается ошибкой"""
+        if self._closed:
+            return
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+
+            print(f"⚠️  Реплика {index} завершилась (код {process.exitcode}), перезапуск")
+            self._ready.discard(index)
+            task_id = self._in_flight.pop(index, None)
+            if task_id is not None:
+                with self._lock:
+                    future = self._futures.pop(task_id, None)
+                if future is not None:
+                    future.set_exception(RuntimeError(f'Реплика {index} упала во время инференса'))
+            self._processes[index] = self._spawn(index)
+
+
+def _replica_main(index, model_path, threads, cores, tasks, results):
+    """Цикл процесса-реплики: своя модель, свои потоки, свои ядра"""
+    # Ограничиваем потоки до импорта torch, иначе OpenMP уже создаст свой пул
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from model_registry import registry
+
+    registry.warmup(model_path)
+    print(f"🧵 Реплика {index}: потоков {threads}, ядра {cores or 'любые'}")
+    results.put(('ready', index, None, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        task_id, images, conf_threshold, tile_size = task
+        results.put(('taken', index, task_id, None))
+        try:
+            detector, version = registry.get_with_version(model_path)
+            if tile_size:
+                output = detector.detect_tiles(images, conf_threshold, imgsz=tile_size)
+            else:
+                output = detector.detect_errors_batch(images, conf_threshold=conf_threshold,
+                                                      batch_size=len(images))
+            results.put(('done', index, task_id, (output, version)))
+        except Exception as e:
+            results.put(('failed', index, task_id, f'{type(e).__name__}: {e}'))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Общий пул процесса (создаётся при первом обращении)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InferencePool()
+        return _pool
@@ -0,0 +1,260 @@
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+
+class JobTimeout(Exception):
+    """Задача не уложилась в отведённое время"""
+
+
+class JobContext:
+    """
+    Контекст выполняемой задачи: срок и проверка таймаута
+
+    Поток Python нельзя прервать снаружи, поэтому таймаут кооперативный:
+    обработчик вызывает check() между этапами и передаёт remaining()
+    в блокирующие ожидания (например, результатов батчера).
+    """
+
+    def __init__(self, job_id, timeout):
+        self.job_id = job_id
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise JobTimeout(f'Задача {self.job_id} превысила {self.timeout} с')
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач в БД приложения (SQLite, без внешнего брокера)
+
+    Строки модели задач проходят статусы queued → in_progress →
+    completed/failed. Рабочие потоки забирают задачу условным UPDATE
+    (только если она всё ещё queued), так что несколько процессов
+    сервера могут обслуживать одну очередь. Упавшую задачу повторяют
+    с нарастающей задержкой до max_attempts раз. Взятая задача держит
+    аренду (lease_until); если процесс умер, задача по истечении аренды
+    возвращается в очередь любым живым процессом.
+
+    Модель задач должна иметь колонки: status, attempts, max_attempts,
+    run_after, lease_until, worker, error, result, started_at, finished_at.
+    """
+
+    def __init__(self, app, db, model, handler, workers=None, max_attempts=None,
+                 timeout=None, poll_interval=None, on_status=None, on_committed=None,
+                 name='job-queue'):
+        """
+        Args:
+            handler: функция (job, context) -> dict с результатом (сохраняется в job.result)
+            on_status: функция (job, status), вызывается в той же транзакции,
+                       что и смена статуса задачи (например, для AnalysisResult.status)
+            on_committed: функция (job, status), вызывается после коммита смены статуса
+                          (уведомления: изменение уже видно в БД)
+        """
+        self.app = app
+        self.db = db
+        self.model = model
+        self.handler = handler
+        self.workers = config.JOB_WORKERS if workers is None else workers
+        self.max_attempts = max_attempts or config.JOB_MAX_ATTEMPTS
+        self.timeout = timeout or config.JOB_TIMEOUT
+        self.poll_interval = poll_interval or config.JOB_POLL_INTERVAL
+        self.on_status = on_status
+        self.on_committed = on_committed
+        self.name = name
+
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Запускает рабочие потоки (повторный вызов ничего не делает)"""
+        with self._start_lock:
+            if self._threads or self.workers <= 0:
+                return
+            for i in range(self.workers):
+                worker = f'{socket.gethostname()}:{os.getpid()}:{i}'
+                thread = threading.Thread(target=self._loop, args=(worker,),
+                                          name=f'{self.name}-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print(f"🧰 Очередь задач: {self.workers} потоков")
+
+    def enqueue(self, **fields):
+        """Ставит задачу в очередь (в текущей сессии) и будит рабочие потоки"""
+        job = self.model(status='queued', attempts=0, max_attempts=self.max_attempts, **fields)
+        self.db.session.add(job)
+        self.db.session.flush()
+        self._set_status(job, 'queued')
+        self._commit()
+        self._wakeup.set()
+        return job
+
+    def run_inline(self, job):
+        """Выполнить задачу в текущем потоке (очередь без рабочих потоков)"""
+        job.status = 'in_progress'
+        job.attempts += 1
+        job.started_at = datetime.utcnow()
+        self._set_status(job, 'in_progress')
+        self._commit()
+        return self._execute(job.id, job.attempts)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=self.timeout)
+
+    def counts(self):
+        """Число задач по статусам"""
+        rows = self.db.session.query(self.model.status, self.db.func.count(self.model.id)) \
+            .group_by(self.model.status).all()
+        return dict(rows)
+
+    def _loop(self, worker):
+        last_recovery = 0.0
+        while not self._closed:
+            try:
+                with self.app.app_context():
+                    if time.monotonic() - last_recovery >= self.poll_interval:
+                        self._recover()
+                        last_recovery = time.monotonic()
+
+                    claimed = self._claim(worker)
+                    if claimed is not None:
+                        self._execute(*claimed)
+                        continue
+            except Exception as e:
+                print(f"❌ Очередь задач ({worker}): {type(e).__name__}: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim(self, worker):
+        table = self.model.__table__
+        now = datetime.utcnow()
+
+        candidate = self.db.session.execute(
+            self.db.select(table.c.id)
+            .where(table.c.status == 'queued')
+            .where(self.db.or_(table.c.run_after.is_(None), table.c.run_after <= now))
+            .order_by(table.c.id)
+            .limit(1)
+        ).scalar()
+        if candidate is None:
+            self.db.session.rollback()
+            return None
+
+        # Условный UPDATE: если задачу успел забрать другой поток/процесс, rowcount = 0
+        claimed = self.db.session.execute(
+            table.update()
+            .where(table.c.id == candidate, table.c.status == 'queued')
+            .values(status='in_progress', worker=worker, started_at=now,
+                    lease_until=now + timedelta(seconds=self.timeout + config.JOB_LEASE_GRACE),
+                    attempts=table.c.attempts + 1)
+        ).rowcount
+        if not claimed:
+            self.db.session.rollback()
+            return None
+
+        job = self.db.session.get(self.model, candidate)
+        self._set_status(job, 'in_progress')
+        self._commit()
+        return job.id, job.attempts
+
+    def _execute(self, job_id, attempt):
+        job = self.db.session.get(self.model, job_id)
+        context = JobContext(job_id, self.timeout)
+        try:
+            # Обработчик не коммитит: его записи и статус completed
+            # фиксируются одной транзакцией
+            result = self.handler(job, context)
+            self.db.session.refresh(job)
+        except Exception as e:
+            self.db.session.rollback()
+            self._fail(job_id, attempt, e)
+            return None
+
+        if not self._still_owned(job, attempt):
+            self.db.session.rollback()
+            return None
+
+        job.status = 'completed'
+        job.result = json.dumps(result, ensure_ascii=False)
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        job.lease_until = None
+        self._set_status(job, 'completed')
+        self._commit()
+        return result
+
+    def _fail(self, job_id, attempt, error):
+        job = self.db.session.get(self.model, job_id)
+        if not self._still_owned(job, attempt):
+            return
+
+        job.error = f'{type(error).__name__}: {error}'
+        job.lease_until = None
+        # Без рабочих потоков (run_inline) повторять некому
+        if job.attempts < job.max_attempts and self.workers > 0:
+            delay = config.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            print(f"🔁 Задача {job.id}: попытка {job.attempts}/{job.max_attempts} не удалась "
+                  f"({job.error}), повтор через {delay} с")
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            print(f"❌ Задача {job.id} не выполнена: {job.error}")
+        self._set_status(job, job.status)
+        self._commit()
+
+    def _recover(self):
+        """Возвращает в очередь задачи, чья аренда истекла (процесс-исполнитель умер)"""
+        now = datetime.utcnow()
+        expired = self.model.query.filter(self.model.status == 'in_progress',
+                                          self.model.lease_until < now).all()
+        for job in expired:
+            job.error = f'Аренда истекла (исполнитель {job.worker} не ответил)'
+            job.lease_until = None
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_after = None
+            else:
+                job.status = 'failed'
+                job.finished_at = now
+            print(f"♻️  Задача {job.id} после сбоя исполнителя → {job.status}")
+            self._set_status(job, job.status)
+        if expired:
+            self._commit()
+            self._wakeup.set()
+        else:
+            self.db.session.rollback()
+
+    @staticmethod
+    def _still_owned(job, attempt):
+        # Пока задача выполнялась, её могли вернуть в очередь по истечении аренды
+        return job is not None and job.status == 'in_progress' and job.attempts == attempt
+
+    def _set_status(self, job, status):
+        if self.on_status is not None:
+            self.on_status(job, status)
+        self.db.session.info.setdefault('job_status_changes', []).append((job, status))
+
+    def _commit(self):
+        self.db.session.commit()
+        changes = self.db.session.info.pop('job_status_changes', [])
+        if self.on_committed is not None:
+            for job, status in changes:
+                self.on_committed(job, status)
@@ -1,6 +1,8 @@
 from GOSTErrorDetector import GOSTErrorDetector
 import os
-from pdf2image import convert_from_path
+
+import config
+from pdf_pages import iter_inference_pages
 
 from utils import convert_pdfs_to_images
 
@@ -28,20 +30,28 @@ def main_pipeline(pdf_folder):
 
     for pdf in os.listdir(pdf_folder):
         if pdf.endswith('.pdf'):
-            # Конвертируем
-            images = convert_from_path(os.path.join(pdf_folder, pdf))
-
-            # Проверяем каждую страницу
-            for i, img in enumerate(images):
-                img.save(f'temp_page_{i}.png')
-                errors = detector.detect_errors(f'temp_page_{i}.png')
-
-                if errors:
-                    print(f"\n❌ {pdf} - страница {i + 1}:")
-                    for error in errors:
-                        print(f"  • {error['type']} (важность: {error['severity']})")
-                else:
-                    print(f"\n✅ {pdf} - страница {i + 1}: ошибок не найдено")
+            # Конвертируем постранично и проверяем пачками по BATCH_MAX_SIZE листов
+            chunk = []
+            for page_number, img in iter_inference_pages(os.path.join(pdf_folder, pdf)):
+                chunk.append((page_number, img))
+                if len(chunk) == config.BATCH_MAX_SIZE:
+                    report_pages(detector, pdf, chunk)
+                    chunk = []
+            if chunk:
+                report_pages(detector, pdf, chunk)
+
+
+def report_pages(detector, pdf, chunk):
+    """Проверяет пачку страниц одним пакетным проходом и печатает результат"""
+    page_errors = detector.detect_errors_batch([img for _, img in chunk])
+
+    for (page_number, _), errors in zip(chunk, page_errors):
+        if errors:
+            print(f"\n❌ {pdf} - страница {page_number}:")
+            for error in errors:
+                print(f"  • {error['type']} (важность: {error['severity']})")
+        else:
+            print(f"\n✅ {pdf} - страница {page_number}: ошибок не найдено")
 
 
 # Запуск
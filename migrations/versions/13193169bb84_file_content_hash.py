@@ -0,0 +1,28 @@
+"""Content hash of uploaded files
+
+Revision ID: 13193169bb84
+Revises: bae620a2fafd
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '13193169bb84'
+down_revision = 'bae620a2fafd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_file_entry_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_file_entry_content_hash'))
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,40 @@
+"""Result cache by page content hash
+
+Revision ID: 2091923ee300
+Revises: 05502fa6c839
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2091923ee300'
+down_revision = '05502fa6c839'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cached_detection',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('page_hash', sa.String(length=64), nullable=False),
+    sa.Column('model_version', sa.String(length=50), nullable=False),
+    sa.Column('conf_threshold', sa.Float(), nullable=False),
+    sa.Column('detections', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.Column('hit_count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('page_hash', 'model_version', 'conf_threshold', name='uq_cached_detection_key')
+    )
+    with op.batch_alter_table('cached_detection', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cached_detection_last_used_at'), ['last_used_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cached_detection', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cached_detection_last_used_at'))
+
+    op.drop_table('cached_detection')
@@ -0,0 +1,49 @@
+"""Background analysis jobs
+
+Revision ID: 624fd9511f36
+Revises: e1a0d6f3bb67
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '624fd9511f36'
+down_revision = 'e1a0d6f3bb67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('analysis_id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=True),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(length=100), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['analysis_id'], ['analysis_result.id'], ),
+    sa.ForeignKeyConstraint(['file_id'], ['file_entry.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_analysis_job_analysis_id'), ['analysis_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_analysis_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_job_status'))
+        batch_op.drop_index(batch_op.f('ix_analysis_job_analysis_id'))
+
+    op.drop_table('analysis_job')
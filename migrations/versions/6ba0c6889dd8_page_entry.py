@@ -0,0 +1,60 @@
+"""Pages of multi-page files
+
+Revision ID: 6ba0c6889dd8
+Revises: 81cca0c4843e
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6ba0c6889dd8'
+down_revision = '81cca0c4843e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('page_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('page_number', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=200), nullable=False),
+    sa.Column('filepath', sa.String(length=300), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['file_entry.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('page_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_page_entry_file_id'), ['file_id'], unique=False)
+
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('page_count', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('detected_error', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('page_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('page_number', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_detected_error_page_id', 'page_entry', ['page_id'], ['id'])
+
+    # Ошибки, найденные до постраничного режима, — на первом листе
+    op.execute('UPDATE detected_error SET page_number = 1 WHERE page_number IS NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('detected_error', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_detected_error_page_id', type_='foreignkey')
+        batch_op.drop_column('page_number')
+        batch_op.drop_column('page_id')
+
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.drop_column('page_count')
+
+    with op.batch_alter_table('page_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_page_entry_file_id'))
+
+    op.drop_table('page_entry')
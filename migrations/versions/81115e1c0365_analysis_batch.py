@@ -0,0 +1,63 @@
+"""Batch analysis of drawing sets
+
+Revision ID: 81115e1c0365
+Revises: 624fd9511f36
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '81115e1c0365'
+down_revision = '624fd9511f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('upload_session', sa.String(length=64), nullable=True),
+    sa.Column('file_count', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=True),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(length=100), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('analysis_batch', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_analysis_batch_status'), ['status'], unique=False)
+
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('batch_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_analysis_result_batch_id'), ['batch_id'], unique=False)
+        batch_op.create_foreign_key('fk_analysis_result_batch_id', 'analysis_batch', ['batch_id'], ['id'])
+
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upload_session', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_file_entry_upload_session'), ['upload_session'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_file_entry_upload_session'))
+        batch_op.drop_column('upload_session')
+
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_analysis_result_batch_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_analysis_result_batch_id'))
+        batch_op.drop_column('batch_id')
+
+    with op.batch_alter_table('analysis_batch', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_batch_status'))
+
+    op.drop_table('analysis_batch')
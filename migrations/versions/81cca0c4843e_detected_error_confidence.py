@@ -0,0 +1,35 @@
+"""Detection confidence on detected errors
+
+Revision ID: 81cca0c4843e
+Revises: 2091923ee300
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '81cca0c4843e'
+down_revision = '2091923ee300'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('detected_error', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('confidence', sa.Float(), nullable=True))
+        batch_op.create_index('ix_detected_error_analysis_confidence', ['analysis_id', 'confidence'], unique=False)
+
+    # Старые записи хранили уверенность только в extra_data; без переноса
+    # NULL проходил бы любой порог min_conf
+    op.execute(
+        "UPDATE detected_error SET confidence = json_extract(extra_data, '$.confidence') "
+        "WHERE confidence IS NULL AND json_valid(extra_data)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('detected_error', schema=None) as batch_op:
+        batch_op.drop_index('ix_detected_error_analysis_confidence')
+        batch_op.drop_column('confidence')
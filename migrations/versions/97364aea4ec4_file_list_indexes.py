@@ -0,0 +1,32 @@
+"""Indexes for paginated file lists
+
+Revision ID: 97364aea4ec4
+Revises: 81115e1c0365
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '97364aea4ec4'
+down_revision = '81115e1c0365'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_file_entry_uploaded_id', ['uploaded_at', 'id'], unique=False)
+
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.create_index('ix_analysis_result_file_checked', ['file_id', 'checked_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.drop_index('ix_analysis_result_file_checked')
+
+    with op.batch_alter_table('file_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_file_entry_uploaded_id')
@@ -0,0 +1,26 @@
+"""Full-size display copy of inference rasters
+
+Revision ID: bae620a2fafd
+Revises: 6ba0c6889dd8
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bae620a2fafd'
+down_revision = '6ba0c6889dd8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('page_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('display_filename', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('page_entry', schema=None) as batch_op:
+        batch_op.drop_column('display_filename')
@@ -0,0 +1,32 @@
+"""Reference counts of content-addressed blobs
+
+Revision ID: e1a0d6f3bb67
+Revises: 13193169bb84
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a0d6f3bb67'
+down_revision = '13193169bb84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_blob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=80), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_blob')
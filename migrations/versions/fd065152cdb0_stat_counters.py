@@ -0,0 +1,43 @@
+"""Materialized statistics counters
+
+Revision ID: fd065152cdb0
+Revises: 97364aea4ec4
+Create Date: 2026-10-17 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fd065152cdb0'
+down_revision = '97364aea4ec4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stat_total',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=20), nullable=False),
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('metric', 'dimension', 'key', name='uq_stat_total_key')
+    )
+    op.create_table('stat_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('metric', sa.String(length=20), nullable=False),
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'metric', 'dimension', 'key', name='uq_stat_daily_key')
+    )
+
+
+def downgrade():
+    op.drop_table('stat_daily')
+    op.drop_table('stat_total')
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+import time
+
+import config
+from GOSTErrorDetector import GOSTErrorDetector
+
+
+class ModelRegistry:
+    """
+    Реестр загруженных моделей: одна копия детектора на файл весов в процессе.
+
+    Модель загружается при первом обращении (или при прогреве на старте),
+    а при изменении файла весов на диске перезагружается автоматически.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._path_locks = {}
+        self._loading = set()
+        self._versions = {}
+
+    def get(self, model_path=None):
+        """Возвращает готовый детектор, перезагружая его если веса изменились"""
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        return self._get_entry(model_path)['detector']
+
+    def get_with_version(self, model_path=None):
+        """Детектор и версия его весов — из одной записи, без гонки с перезагрузкой"""
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        entry = self._get_entry(model_path)
+        return entry['detector'], entry['version']
+
+    def get_version(self, model_path=None):
+        """Версия модели (короткий sha256 файла весов + бэкенд)"""
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        return self._get_entry(model_path)['version']
+
+    def weights_version(self, model_path=None, backend=None):
+        """
+        Версия весов без загрузки модели (для процессов, где инференс идёт
+        в пуле реплик). Хэш пересчитывается только при изменении файла.
+        """
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        backend = backend or config.INFERENCE_BACKEND
+        stamp = self._file_stamp(model_path)
+
+        cached = self._versions.get(model_path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, self._file_version(model_path))
+            self._versions[model_path] = cached
+
+        if backend != 'pytorch':
+            return f'{cached[1]}-{backend}'
+        return cached[1]
+
+    def warmup(self, model_path=None):
+        """Загрузка модели и пробный прогон на пустом изображении"""
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        entry = self._get_entry(model_path)
+        if not entry['warm']:
+            start = time.time()
+            entry['detector'].warmup()
+            entry['warm'] = True
+            print(f"🔥 Модель прогрета за {time.time() - start:.2f} с")
+        return entry['detector']
+
+    def warmup_async(self, model_path=None):
+        """Прогрев в фоне, чтобы не блокировать старт сервера"""
+        def _run():
+            try:
+                self.warmup(model_path)
+            except Exception as e:
+                print(f"❌ Не удалось прогреть модель: {str(e)}")
+
+        thread = threading.Thread(target=_run, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, model_path=None):
+        """Модель загружена, прогрета и соответствует файлу на диске"""
+        model_path = os.path.abspath(model_path or config.MODEL_WEIGHTS)
+        entry = self._entries.get(model_path)
+        if entry is None or not entry['warm']:
+            return False
+        try:
+            return entry['stamp'] == self._file_stamp(model_path)
+        except FileNotFoundError:
+            return False
+
+    def status(self):
+        """Состояние всех загруженных моделей (для /health/ready)"""
+        return {
+            path: {
+                'version': entry['version'],
+                'backend': entry['detector'].backend,
+                'warm': entry['warm'],
+                'loaded_at': entry['loaded_at'],
+                'load_time': round(entry['load_time'], 3),
+                'loading': path in self._loading
+            }
+            for path, entry in list(self._entries.items())
+        }
+
+    def _get_entry(self, model_path):
+        stamp = self._file_stamp(model_path)
+        entry = self._entries.get(model_path)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry
+
+        # Загрузка под отдельной блокировкой на файл весов:
+        # параллельные запросы ждут одну загрузку, а не запускают свои
+        with self._lock:
+            path_lock = self._path_locks.setdefault(model_path, threading.Lock())
+
+        with path_lock:
+            entry = self._entries.get(model_path)
+            stamp = self._file_stamp(model_path)
+            if entry is None or entry['stamp'] != stamp:
+                if entry is not None:
+                    print(f"♻️  Веса изменились, перезагрузка: {model_path}")
+                was_warm = entry is not None and entry['warm']
+                self._loading.add(model_path)
+                try:
+                    entry = self._load(model_path, stamp)
+                    # Горячая замена не должна отдавать холодную модель
+                    if was_warm:
+                        entry['detector'].warmup()
+                        entry['warm'] = True
+                finally:
+                    self._loading.discard(model_path)
+                self._entries[model_path] = entry
+        return entry
+
+    def _load(self, model_path, stamp):
+        start = time.time()
+        detector = GOSTErrorDetector(model_path)
+        version = self.weights_version(model_path, detector.backend)
+        return {
+            'detector': detector,
+            'stamp': stamp,
+            'version': version,
+            'warm': False,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'load_time': time.time() - start
+        }
+
+    @staticmethod
+    def _file_stamp(model_path):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"❌ Модель не найдена: {model_path}\n"
+                f"💡 Обучите модель командой: python train_yolo.py"
+            )
+        stat = os.stat(model_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _file_version(model_path):
+        sha = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()[:12]
+
+
+# Общий реестр процесса
+registry = ModelRegistry()
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+
+class OCREnginePool:
+    """
+    Пул загруженных EasyOCR Reader для одного набора языков
+
+    Загрузка Reader (детектор CRAFT + распознаватель) занимает секунды,
+    поэтому читатели создаются один раз на процесс и выдаются потокам
+    во временное пользование. Одновременно работает не больше size
+    читателей — столько же, сколько потоков, выполняющих OCR.
+    """
+
+    def __init__(self, languages=None, size=None, gpu=None):
+        self.languages = list(languages or config.OCR_LANGUAGES)
+        self.size = max(1, size or config.OCR_WORKERS)
+        self.gpu = config.OCR_GPU if gpu is None else gpu
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reader(self, timeout=None):
+        """Выдаёт свободный Reader на время блока with"""
+        reader = self._acquire(timeout)
+        try:
+            yield reader
+        finally:
+            self._idle.put(reader)
+
+    def readtext(self, image, **kwargs):
+        with self.reader() as reader:
+            return reader.readtext(image, **kwargs)
+
+    def readtext_batched(self, images, **kwargs):
+        """Пакетное распознавание изображений одного размера одним Reader"""
+        with self.reader() as reader:
+            return reader.readtext_batched(images, **kwargs)
+
+    def warmup(self):
+        """Загружает все size читателей заранее (например, при старте воркера)"""
+        readers = [self._acquire(None) for _ in range(self.size)]
+        for reader in readers:
+            self._idle.put(reader)
+
+    def stats(self):
+        return {
+            'languages': self.languages,
+            'size': self.size,
+            'loaded': self._created,
+            'idle': self._idle.qsize()
+        }
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if not create:
+            return self._idle.get(timeout=timeout)
+
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _create(self):
+        import easyocr
+
+        start = time.time()
+        reader = easyocr.Reader(self.languages, gpu=self.gpu)
+        print(f"🔤 EasyOCR {'+'.join(self.languages)} загружен за {time.time() - start:.1f} с")
+        return reader
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_ocr_pool(languages=None):
+    """Общий пул процесса для набора языков (по умолчанию config.OCR_LANGUAGES)"""
+    key = tuple(languages or config.OCR_LANGUAGES)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = OCREnginePool(key)
+        return _pools[key]
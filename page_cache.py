@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import config
+from blob_store import BlobStore
+from utils import file_sha256
+
+
+class PageCache:
+    """
+    Дисковый кэш растеризованных страниц
+
+    Ключ — (sha256 PDF, страница, разрешение, цветность), значение —
+    декодированный массив в .npy: он открывается через mmap без
+    декодирования PNG и без копирования в память процесса. Объём кэша
+    ограничен max_bytes, вытесняются давно не читанные страницы
+    (время последнего чтения — mtime файла). Размеры и время чтения
+    держатся в памяти, а каталог пересканируется не чаще раза
+    в rescan_seconds: кэш делят несколько процессов сервера, и свои
+    записи каждый процесс видит сразу, а чужие — после пересканирования.
+    """
+
+    def __init__(self, root, max_bytes, rescan_seconds=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.rescan_seconds = (config.PAGE_CACHE_RESCAN_SECONDS
+                               if rescan_seconds is None else rescan_seconds)
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        self._index = self._scan()  # имя файла → [размер, время чтения]
+        self._bytes = sum(size for size, _ in self._index.values())
+        self._scanned_at = time.monotonic()
+
+    def get(self, pdf_path, page_number, render, dpi=None, grayscale=False, scale_to=None):
+        """
+        Страница из кэша или render() → сохранить → вернуть
+
+        Args:
+            render: функция без аргументов, возвращающая PIL-изображение страницы
+
+        Returns:
+            numpy-массив (только для чтения, отображён в память)
+        """
+        name = self._key(pdf_path, page_number, dpi, grayscale, scale_to)
+        path = os.path.join(self.root, name)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)  # порядок вытеснения переживает перезапуск
+            with self._lock:
+                self._stats['hits'] += 1
+                entry = self._index.get(name)
+                if entry is None:
+                    # Страницу положил другой процесс
+                    self._add(name, os.path.getsize(path))
+                else:
+                    entry[1] = time.time()
+            return array
+        except (FileNotFoundError, ValueError):
+            pass
+
+        image = render()
+        array = np.asarray(image)
+        image.close()
+
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._stats['misses'] += 1
+            self._add(name, os.path.getsize(path))
+        self._evict()
+        return np.load(path, mmap_mode='r')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['bytes'] = self._bytes
+            stats['pages'] = len(self._index)
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def _key(self, pdf_path, page_number, dpi, grayscale, scale_to):
+        resolution = f'{scale_to}px' if scale_to else f'{dpi or config.PDF_DPI}dpi'
+        colorspace = 'gray' if grayscale else 'rgb'
+        return f'{self._pdf_hash(pdf_path)}-p{page_number}-{resolution}-{colorspace}.npy'
+
+    def _pdf_hash(self, pdf_path):
+        # Файлы из хранилища загрузок уже названы своим хэшем
+        name = os.path.basename(pdf_path)
+        if BlobStore.is_key(name):
+            return name.split('.', 1)[0]
+
+        stat = os.stat(pdf_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cache_key = os.path.abspath(pdf_path)
+        cached = self._hashes.get(cache_key)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, file_sha256(pdf_path))
+            self._hashes[cache_key] = cached
+        return cached[1]
+
+    def _scan(self):
+        index = {}
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                index[entry.name] = [stat.st_size, stat.st_mtime]
+        return index
+
+    def _rescan(self):
+        """Индекс по реальному содержимому каталога (страницы других процессов)"""
+        index = self._scan()
+        with self._lock:
+            for name, entry in index.items():
+                known = self._index.get(name)
+                if known is not None:
+                    entry[1] = max(entry[1], known[1])
+            self._index = index
+            self._bytes = sum(size for size, _ in index.values())
+            self._scanned_at = time.monotonic()
+
+    def _add(self, name, size):
+        # Вызывается под self._lock; страница могла перезаписаться — старый размер вычитается
+        previous = self._index.get(name)
+        if previous is not None:
+            self._bytes -= previous[0]
+        self._index[name] = [size, time.time()]
+        self._bytes += size
+
+    def _evict(self):
+        """Удаляет давно не читанные страницы, пока кэш не уложится в max_bytes"""
+        if time.monotonic() - self._scanned_at >= self.rescan_seconds:
+            self._rescan()
+
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            victims = []
+            for name, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+                if self._bytes <= self.max_bytes:
+                    break
+                del self._index[name]
+                self._bytes -= size
+                victims.append(name)
+            self._stats['evicted'] += len(victims)
+
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Общий кэш страниц процесса (None, если config.PAGE_CACHE_MAX_BYTES = 0)"""
+    global _cache
+    if not config.PAGE_CACHE_MAX_BYTES:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache(config.PAGE_CACHE_FOLDER, config.PAGE_CACHE_MAX_BYTES)
+        return _cache
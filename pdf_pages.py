@@ -0,0 +1,167 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+import config
+
+# poppler_path=None — утилиты poppler ищутся в PATH
+
+
+def count_pages(pdf_path, poppler_path=config.POPPLER_PATH):
+    """Число страниц PDF (через pdfinfo, без растеризации)"""
+    info = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)
+    return int(info['Pages'])
+
+
+def inference_long_side():
+    """
+    Длинная сторона растра, которого достаточно детектору
+
+    Без тайлов модель всё равно сжимает страницу до DETECTOR_IMGSZ.
+    С тайлами — None: страница рисуется в полные PDF_DPI, иначе мелкие
+    объекты (*, стрелки допусков) теряются ещё до нарезки — лист A1/A0
+    при 300 DPI длиннее 10000 px.
+    """
+    if config.TILED_INFERENCE:
+        return None
+    return config.DETECTOR_IMGSZ
+
+
+def rasterize_page(pdf_path, page_number, dpi=None, poppler_path=config.POPPLER_PATH,
+                   grayscale=False, scale_to=None, cache=False):
+    """
+    Растеризует одну страницу PDF (нумерация с 1) в PIL-изображение
+
+    Args:
+        grayscale: просить у poppler сразу оттенки серого (-gray)
+        scale_to: длинная сторона в пикселях (-scale-to); эффективный DPI
+                  считается poppler для каждого листа по его формату
+        cache: брать страницу из общего кэша страниц (см. load_page)
+    """
+    if cache:
+        return Image.fromarray(load_page(pdf_path, page_number, dpi, poppler_path, grayscale, scale_to))
+
+    pages = convert_from_path(
+        pdf_path,
+        dpi=dpi or config.PDF_DPI,
+        first_page=page_number,
+        last_page=page_number,
+        poppler_path=poppler_path,
+        grayscale=grayscale,
+        size=scale_to
+    )
+    return pages[0]
+
+
+def load_page(pdf_path, page_number, dpi=None, poppler_path=config.POPPLER_PATH,
+              grayscale=False, scale_to=None):
+    """
+    Страница PDF как numpy-массив через общий дисковый кэш страниц
+
+    Загрузка, анализ штампа и OCR берут одну и ту же страницу отсюда,
+    и poppler запускается только при первом обращении. Без кэша
+    (PAGE_CACHE_MAX_BYTES = 0) страница просто растеризуется.
+    """
+    from page_cache import get_page_cache
+
+    def render():
+        return rasterize_page(pdf_path, page_number, dpi, poppler_path, grayscale, scale_to)
+
+    cache = get_page_cache()
+    if cache is None:
+        return np.asarray(render())
+    return cache.get(pdf_path, page_number, render, dpi=dpi, grayscale=grayscale, scale_to=scale_to)
+
+
+class PageRef:
+    """
+    Ссылка на страницу PDF без растеризации
+
+    Проверки штампа получают её вместо пути к PDF: текст берётся из
+    текстового слоя, а растр — из кэша страниц, только когда он нужен.
+    """
+
+    def __init__(self, pdf_path, page_number=1, dpi=None):
+        self.pdf_path = pdf_path
+        self.page_number = page_number
+        self.dpi = dpi or config.PDF_DPI
+
+    def image(self, grayscale=False):
+        return load_page(self.pdf_path, self.page_number, dpi=self.dpi, grayscale=grayscale)
+
+    def __repr__(self):
+        return f'<PageRef {self.pdf_path}:{self.page_number}@{self.dpi}>'
+
+
+def rasterize_for_inference(pdf_path, page_number, poppler_path=config.POPPLER_PATH):
+    """Страница в режиме config.RASTER_MODE: 'inference' — серый растер под детектор, 'full' — PDF_DPI RGB"""
+    if config.RASTER_MODE == 'inference':
+        return rasterize_page(pdf_path, page_number, dpi=config.PDF_DPI, poppler_path=poppler_path,
+                              grayscale=True, scale_to=inference_long_side(), cache=True)
+    return rasterize_page(pdf_path, page_number, dpi=config.PDF_DPI, poppler_path=poppler_path, cache=True)
+
+
+def iter_pages(pdf_path, dpi=None, first_page=1, last_page=None, poppler_path=config.POPPLER_PATH,
+               grayscale=False, scale_to=None):
+    """
+    Постраничная растеризация PDF
+
+    poppler вызывается на каждую страницу отдельно (first_page/last_page),
+    поэтому в памяти одновременно находится только одна страница,
+    даже для комплекта из десятков листов.
+
+    Yields:
+        (page_number, PIL.Image)
+    """
+    last_page = last_page or count_pages(pdf_path, poppler_path)
+    for page_number in range(first_page, last_page + 1):
+        yield page_number, rasterize_page(pdf_path, page_number, dpi, poppler_path,
+                                          grayscale=grayscale, scale_to=scale_to)
+
+
+def iter_inference_pages(pdf_path, poppler_path=config.POPPLER_PATH, prefetch=True):
+    """
+    Постраничная растеризация в режиме config.RASTER_MODE
+
+    С prefetch первая страница начинает рисоваться сразу, параллельно
+    с подсчётом страниц, а следующая — пока вызывающий код сохраняет
+    текущую. В памяти не больше двух страниц.
+    """
+    if not prefetch:
+        for page_number in range(1, count_pages(pdf_path, poppler_path) + 1):
+            yield page_number, rasterize_for_inference(pdf_path, page_number, poppler_path)
+        return
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='rasterize') as executor:
+        pending = executor.submit(rasterize_for_inference, pdf_path, 1, poppler_path)
+        page_count = count_pages(pdf_path, poppler_path)
+        for page_number in range(1, page_count + 1):
+            image = pending.result()
+            if page_number < page_count:
+                pending = executor.submit(rasterize_for_inference, pdf_path, page_number + 1, poppler_path)
+            yield page_number, image
+
+
+def encode_png(image):
+    """PNG-байты изображения (для записи в хранилище по хэшу)"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def save_png(image, path):
+    """
+    Сохраняет изображение в PNG, считая sha256 и размер по тем же байтам
+
+    Returns:
+        (file_size, sha256)
+    """
+    data = encode_png(image)
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data), hashlib.sha256(data).hexdigest()
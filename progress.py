@@ -0,0 +1,102 @@
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class Subscription:
+    """Очередь событий одного подписчика (одного SSE-соединения)"""
+
+    def __init__(self, analysis_ids=None, user_id=None, maxsize=None):
+        self.analysis_ids = set(analysis_ids) if analysis_ids is not None else None
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=maxsize or config.PROGRESS_QUEUE_SIZE)
+
+    def matches(self, event):
+        if self.analysis_ids is not None:
+            return event.get('analysis_id') in self.analysis_ids
+        if self.user_id is not None:
+            return event.get('user_id') == self.user_id
+        return True
+
+    def put(self, event):
+        # Медленный клиент не должен тормозить анализ: старые события выбрасываем
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Следующее событие или None по таймауту"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ProgressBroker:
+    """
+    Внутрипроцессная рассылка событий о ходе анализа
+
+    Очередь задач и загрузка публикуют события (этап, страница k из n,
+    статус), SSE-соединения подписываются на набор анализов (одно
+    соединение на все анализы страницы) или на все анализы пользователя. БД при этом не опрашивается. Последнее событие
+    каждого анализа хранится, чтобы подписавшийся позже сразу увидел
+    текущее состояние.
+    """
+
+    def __init__(self, history_size=None):
+        self.history_size = history_size or config.PROGRESS_HISTORY_SIZE
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._last = OrderedDict()
+
+    def publish(self, event):
+        event = dict(event, ts=round(time.time(), 3))
+        with self._lock:
+            analysis_id = event.get('analysis_id')
+            if analysis_id is not None:
+                self._last[analysis_id] = event
+                self._last.move_to_end(analysis_id)
+                while len(self._last) > self.history_size:
+                    self._last.popitem(last=False)
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def subscribe(self, analysis_ids=None, user_id=None):
+        subscription = Subscription(analysis_ids, user_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            last = [self._last[analysis_id] for analysis_id in subscription.analysis_ids or ()
+                    if analysis_id in self._last]
+        for event in last:
+            subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+def format_sse(event, name='progress'):
+    """Событие в формате text/event-stream"""
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+# Общий брокер процесса
+broker = ProgressBroker()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import xml.etree.ElementTree as ET
+
+import config
+
+_XHTML = '{http://www.w3.org/1999/xhtml}'
+
+
+def extract_text_layer(pdf_path, page_number=1, region=None, dpi=None, poppler_path=config.POPPLER_PATH):
+    """
+    Текст из текстового слоя PDF (pdftotext -bbox-layout), без растеризации и OCR
+
+    Записи в том же формате, что у StampCheckerEasyOCR.extract_text_easyocr:
+    строка текста, conf=100 и bbox (x, y, w, h) в пикселях растра с тем же dpi —
+    так результаты взаимозаменяемы с OCR. Если задан region, остаются
+    строки внутри области, а координаты отсчитываются от её угла, как у
+    вырезанного фрагмента изображения.
+
+    Args:
+        region: (x0, y0, x1, y1) в долях страницы, например config.TITLE_BLOCK_REGION
+
+    Returns:
+        список {'text', 'conf', 'bbox'}; пустой — если слоя нет (скан)
+        или poppler недоступен
+    """
+    dpi = dpi or config.PDF_DPI
+    pdftotext = os.path.join(poppler_path, 'pdftotext') if poppler_path else 'pdftotext'
+    try:
+        completed = subprocess.run(
+            [pdftotext, '-f', str(page_number), '-l', str(page_number),
+             '-bbox-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            capture_output=True, check=True, timeout=config.TEXT_LAYER_TIMEOUT
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️  Текстовый слой недоступен ({type(e).__name__}), нужен OCR: {pdf_path}")
+        return []
+
+    try:
+        return parse_bbox_layout(completed.stdout, region=region, dpi=dpi)
+    except (ET.ParseError, TypeError, ValueError) as e:
+        # Обрезанный или испорченный вывод pdftotext — как отсутствие слоя
+        print(f"⚠️  Некорректный вывод pdftotext ({type(e).__name__}), нужен OCR: {pdf_path}")
+        return []
+
+
+def parse_bbox_layout(xhtml, region=None, dpi=None):
+    """Разбор вывода pdftotext -bbox-layout (одна страница) в записи {'text', 'conf', 'bbox'}"""
+    dpi = dpi or config.PDF_DPI
+    scale = dpi / 72.0  # координаты pdftotext — в пунктах
+
+    root = ET.fromstring(xhtml)
+    page = root.find(f'.//{_XHTML}page')
+    if page is None:
+        return []
+
+    page_w = float(page.get('width')) * scale
+    page_h = float(page.get('height')) * scale
+    if region:
+        left, top = int(page_w * region[0]), int(page_h * region[1])
+        right, bottom = int(page_w * region[2]), int(page_h * region[3])
+    else:
+        left, top, right, bottom = 0, 0, page_w, page_h
+
+    records = []
+    for line in page.iter(f'{_XHTML}line'):
+        words = [word.text.strip() for word in line.iter(f'{_XHTML}word') if word.text and word.text.strip()]
+        if not words:
+            continue
+
+        x_min, y_min = float(line.get('xMin')) * scale, float(line.get('yMin')) * scale
+        x_max, y_max = float(line.get('xMax')) * scale, float(line.get('yMax')) * scale
+        center_x, center_y = (x_min + x_max) / 2, (y_min + y_max) / 2
+        if not (left <= center_x < right and top <= center_y < bottom):
+            continue
+
+        records.append({
+            'text': ' '.join(words),
+            'conf': 100,
+            'bbox': (int(x_min - left), int(y_min - top), int(x_max - x_min), int(y_max - y_min))
+        })
+
+    return records
+
+
+def has_text_layer(records, min_chars=None):
+    """Достаточно ли текста, чтобы не запускать OCR (у сканов слоя нет)"""
+    min_chars = config.TEXT_LAYER_MIN_CHARS if min_chars is None else min_chars
+    return sum(len(r['text']) for r in records) >= min_chars
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import config
+
+
+class HashingFileStream:
+    """
+    Приёмник файла из multipart-запроса
+
+    werkzeug пишет в него тело файла по мере разбора запроса, а мы сразу
+    кладём байты во временный файл рядом с конечным местом, считая sha256
+    и размер. После загрузки файл не перечитывается: finish() только
+    переименовывает его, хэш и размер уже известны.
+    """
+
+    def __init__(self, folder, max_size=None):
+        os.makedirs(folder, exist_ok=True)
+        self.max_size = max_size
+        self.size = 0
+        self.path = os.path.join(folder, f'.upload-{uuid.uuid4().hex}.part')
+        self._sha = hashlib.sha256()
+        self._file = open(self.path, 'w+b', buffering=config.UPLOAD_CHUNK_SIZE)
+        self._finished = False
+
+    @property
+    def sha256(self):
+        return self._sha.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            # Приёмник ещё не попал в request.files, и close() потом никто не вызовет
+            self.close()
+            raise RequestEntityTooLarge(f'Файл больше {self.max_size // (1024 * 1024)} МБ')
+        self._sha.update(data)
+        return self._file.write(data)
+
+    def finish(self, destination):
+        """Закрывает файл и переносит его на место; возвращает (размер, sha256)"""
+        self._file.close()
+        os.replace(self.path, destination)
+        self._finished = True
+        return self.size, self.sha256
+
+    def close(self):
+        # Запрос закончился без finish() (ошибка, обрыв) — убираем недописанный файл
+        if not self._file.closed:
+            self._file.close()
+        if not self._finished and os.path.exists(self.path):
+            os.remove(self.path)
+
+    # werkzeug перематывает приёмник после записи и может читать из него
+    def seek(self, offset, whence=0):
+        if self._file.closed:
+            return 0
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def flush(self):
+        self._file.flush()
+
+
+class StreamingUploadRequest(Request):
+    """Request, у которого файлы из формы сразу пишутся на диск через HashingFileStream"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        folder = current_app.config.get('UPLOAD_FOLDER', config.UPLOAD_FOLDER)
+        return HashingFileStream(folder, current_app.config.get('MAX_CONTENT_LENGTH'))
+
+
+def save_upload(file_storage, destination):
+    """
+    Сохраняет загруженный файл, возвращает (размер, sha256)
+
+    Для потоковых загрузок — переименование уже записанного файла,
+    иначе (файл пришёл не через StreamingUploadRequest) — копирование
+    с хэшированием в один проход.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingFileStream):
+        return stream.finish(destination)
+
+    sha = hashlib.sha256()
+    size = 0
+    with open(destination, 'wb') as f:
+        for chunk in iter(lambda: stream.read(config.UPLOAD_CHUNK_SIZE), b''):
+            sha.update(chunk)
+            size += len(chunk)
+            f.write(chunk)
+    return size, sha.hexdigest()
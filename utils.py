@@ -1,20 +1,25 @@
+import hashlib
 import os
-from pdf2image import convert_from_path
 
+from convert_pdfs_to_images import convert_pdf_jobs
 
-def convert_pdfs_to_images(pdf_folder, output_folder, dpi=300):
-    """Конвертация всех PDF в папке в PNG"""
-    os.makedirs(output_folder, exist_ok=True)
 
-    for filename in os.listdir(pdf_folder):
-        if filename.endswith('.pdf'):
-            pdf_path = os.path.join(pdf_folder, filename)
-            pages = convert_from_path(pdf_path, dpi=dpi)
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла (читается кусками)"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def convert_pdfs_to_images(pdf_folder, output_folder, dpi=300, workers=None):
+    """Конвертация всех PDF в папке в PNG (параллельно, с пропуском готовых)"""
+    os.makedirs(output_folder, exist_ok=True)
 
-            for i, page in enumerate(pages):
-                output_path = os.path.join(
-                    output_folder,
-                    f"{filename[:-4]}_page_{i}.png"
-                )
-                page.save(output_path, 'PNG')
-                print(f"✅ Сохранено: {output_path}")
\ No newline at end of file
+    jobs = [
+        (os.path.join(pdf_folder, filename), output_folder, filename[:-4], filename)
+        for filename in sorted(os.listdir(pdf_folder))
+        if filename.endswith('.pdf')
+    ]
+    return convert_pdf_jobs(jobs, output_folder, dpi=dpi, workers=workers, first_index=0)